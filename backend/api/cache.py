@@ -0,0 +1,251 @@
+import threading
+import time
+from collections import OrderedDict
+
+from django.conf import settings
+from django.core.cache import caches
+from django.db import transaction
+
+from foodgram.db_router import use_primary_database
+from recipes.models import Tag
+
+RECIPE_FRAGMENT_VERSION = 4
+
+
+def get_recipes_cache():
+    """Возвращает бэкенд кэша для фрагментов рецептов."""
+    return caches[settings.RECIPES_CACHE_ALIAS]
+
+
+def recipe_fragment_key(recipe_id, version):
+    """Возвращает ключ кэша фрагмента рецепта версии version."""
+    return f"recipe:{recipe_id}:v{RECIPE_FRAGMENT_VERSION}:{version}"
+
+
+def recipe_version_key(recipe_id):
+    """Возвращает ключ кэша версии рецепта."""
+    return f"recipe-version:{recipe_id}"
+
+
+def get_versions(keys):
+    """
+    Возвращает версии по ключам кэша.
+
+    Версия - время последнего изменения в наносекундах. Если версия
+    вытеснена из кэша, она заново инициализируется текущим временем, что
+    приводит лишь к промаху кэша или смене ETag. Недостающие версии
+    записываются одним запросом: данные, загруженные после записи, не
+    старше ее, даже если она перекрыла параллельное обновление версии.
+    """
+    cache = get_recipes_cache()
+    versions = cache.get_many(keys)
+
+    missing = dict.fromkeys(set(keys) - versions.keys(), time.time_ns())
+    if missing:
+        cache.set_many(missing, timeout=None)
+        versions.update(missing)
+
+    return versions
+
+
+def get_recipe_versions(recipe_ids):
+    """
+    Возвращает версии рецептов по их id.
+
+    Версии читаются до загрузки рецептов: если рецепт изменится после
+    этого, фрагмент из устаревших данных ляжет под ключ старой версии,
+    который уже никто не прочитает.
+    """
+    keys = {
+        recipe_version_key(recipe_id): recipe_id for recipe_id in recipe_ids
+    }
+    return {
+        keys[key]: version for key, version in get_versions(keys).items()
+    }
+
+
+def get_recipe_fragments(versions):
+    """Возвращает фрагменты рецептов, переданных словарем версий по id."""
+    keys = {
+        recipe_fragment_key(recipe_id, version): recipe_id
+        for recipe_id, version in versions.items()
+    }
+    cached = get_recipes_cache().get_many(keys)
+    return {keys[key]: fragment for key, fragment in cached.items()}
+
+
+def set_recipe_fragments(fragments, versions):
+    """Сохраняет в кэш фрагменты рецептов под прочитанными версиями."""
+    get_recipes_cache().set_many(
+        {
+            recipe_fragment_key(recipe_id, versions[recipe_id]): fragment
+            for recipe_id, fragment in fragments.items()
+        }
+    )
+
+
+def invalidate_recipe_fragments(recipe_ids):
+    """
+    Сбрасывает кэш фрагментов рецептов, обновляя их версии.
+
+    Версии обновляются после фиксации транзакции, чтобы параллельный
+    запрос не положил в кэш еще не измененные данные под новую версию.
+    """
+    keys = [recipe_version_key(recipe_id) for recipe_id in set(recipe_ids)]
+    if not keys:
+        return
+
+    def bump():
+        now = time.time_ns()
+        get_recipes_cache().set_many(
+            {key: now for key in keys}, timeout=None
+        )
+
+    transaction.on_commit(bump)
+
+
+def table_version_key(table):
+    """Возвращает ключ кэша версии таблицы."""
+    return f"table-version:{table}"
+
+
+def get_table_versions(tables):
+    """Возвращает версии таблиц по их именам."""
+    keys = {table_version_key(table): table for table in tables}
+    return {
+        keys[key]: version for key, version in get_versions(keys).items()
+    }
+
+
+def touch_tables(*tables):
+    """Обновляет версии таблиц после фиксации транзакции."""
+    keys = [table_version_key(table) for table in tables]
+
+    def bump():
+        now = time.time_ns()
+        get_recipes_cache().set_many(
+            {key: now for key in keys}, timeout=None
+        )
+
+    transaction.on_commit(bump)
+
+
+class VersionedProcessCache:
+    """
+    Базовый класс данных, кэшируемых в памяти процесса.
+
+    Данные загружаются методом load() и перезагружаются, когда меняется
+    версия таблицы table, поэтому изменения, сделанные в других процессах,
+    тоже учитываются.
+    """
+
+    table = None
+
+    def __init__(self):
+        self.version = None
+        self.data = None
+        self.lock = threading.Lock()
+
+    def load(self):
+        """Загружает данные из базы."""
+        raise NotImplementedError
+
+    def get_data(self):
+        """
+        Возвращает данные, перезагружая их при смене версии таблицы.
+
+        Данные читаются из основной БД: реплика может еще не содержать
+        изменений, которые отражает новая версия таблицы.
+        """
+        version = get_table_versions((self.table,))[self.table]
+        if version != self.version:
+            with self.lock:
+                if version != self.version:
+                    with use_primary_database():
+                        self.data = self.load()
+                    self.version = version
+        return self.data
+
+    def clear(self):
+        """Сбрасывает данные, чтобы они загрузились при следующем обращении."""
+        self.version = None
+
+
+class TagCache(VersionedProcessCache):
+    """Кэш тэгов в памяти процесса."""
+
+    table = "tags"
+
+    def load(self):
+        """Загружает тэги, упорядоченные по id."""
+        return {tag.id: tag for tag in Tag.objects.all()}
+
+    def all(self):
+        """Возвращает список всех тэгов."""
+        return list(self.get_data().values())
+
+    def get(self, pk):
+        """Возвращает тэг по первичному ключу или None."""
+        return self.get_data().get(pk)
+
+    def slug_choices(self):
+        """Возвращает варианты выбора тэгов по slug."""
+        return [(tag.slug, tag.name) for tag in self.get_data().values()]
+
+    def ids_by_slugs(self, slugs):
+        """Возвращает id тэгов с указанными slug."""
+        slugs = set(slugs)
+        return [
+            tag.id for tag in self.get_data().values() if tag.slug in slugs
+        ]
+
+
+tag_cache = TagCache()
+
+
+class DocumentCache:
+    """
+    LRU-кэш сгенерированных документов в памяти процесса.
+
+    Суммарный размер документов ограничен max_size байт: при переполнении
+    вытесняются документы, к которым дольше всего не обращались.
+    """
+
+    def __init__(self, max_size):
+        self.max_size = max_size
+        self.size = 0
+        self.documents = OrderedDict()
+        self.lock = threading.Lock()
+
+    def get(self, key):
+        """Возвращает документ по ключу или None."""
+        with self.lock:
+            document = self.documents.get(key)
+            if document is not None:
+                self.documents.move_to_end(key)
+            return document
+
+    def set(self, key, document):
+        """Сохраняет документ, вытесняя давно не используемые."""
+        if len(document) > self.max_size:
+            return
+
+        with self.lock:
+            previous = self.documents.pop(key, None)
+            if previous is not None:
+                self.size -= len(previous)
+            self.documents[key] = document
+            self.size += len(document)
+
+            while self.size > self.max_size:
+                _, evicted = self.documents.popitem(last=False)
+                self.size -= len(evicted)
+
+    def clear(self):
+        """Удаляет все документы."""
+        with self.lock:
+            self.documents.clear()
+            self.size = 0
+
+
+shopping_list_cache = DocumentCache(settings.SHOPPING_LIST_CACHE_SIZE)
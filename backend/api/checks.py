@@ -0,0 +1,31 @@
+from django.conf import settings
+from django.core.cache.backends.locmem import LocMemCache
+from django.core.checks import Error, Tags, Warning, register
+
+from .cache import get_recipes_cache
+
+
+@register(Tags.caches)
+def check_recipes_cache(app_configs, **kwargs):
+    """
+    Проверяет, что кэш рецептов общий для всех процессов.
+
+    В кэше рецептов хранятся версии таблиц, по которым вычисляются ETag
+    и перезагружаются кэши процессов. Изменения из команд управления и
+    других процессов gunicorn не видны при кэше в памяти процесса.
+    """
+    if settings.TESTING or not isinstance(get_recipes_cache(), LocMemCache):
+        return []
+
+    level, code = (Warning, "W") if settings.DEBUG else (Error, "E")
+    return [
+        level(
+            "Кэш рецептов хранится в памяти процесса.",
+            hint=(
+                "Укажите в RECIPES_CACHE_BACKEND общий для процессов "
+                "бэкенд, например PyMemcacheCache."
+            ),
+            obj=settings.RECIPES_CACHE_ALIAS,
+            id=f"api.{code}001",
+        )
+    ]
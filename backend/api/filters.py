@@ -1,6 +1,17 @@
+from django.db.models import Case, When
+
 import django_filters
 
-from recipes.models import Ingredient, Recipe, Tag
+from foodgram.constants import MAX_INGREDIENT_SEARCH_RESULTS
+from recipes.models import Ingredient, Recipe
+
+from .cache import tag_cache
+from .search import get_search_backend, ingredient_index
+
+
+def tag_choices():
+    """Возвращает варианты выбора тэгов из кэша."""
+    return tag_cache.slug_choices()
 
 
 class RecipeFilter(django_filters.FilterSet):
@@ -8,21 +19,33 @@ class RecipeFilter(django_filters.FilterSet):
     Фильтр для модели Recipe.
 
     Фильтрует рецепты по автору, тегам, наличию в списке покупок и избранности.
+    Параметр search выполняет ранжированный поиск по названию и описанию.
     """
 
-    tags = django_filters.filters.ModelMultipleChoiceFilter(
-        field_name="tags__slug",
-        to_field_name="slug",
-        queryset=Tag.objects.all(),
+    tags = django_filters.MultipleChoiceFilter(
+        choices=tag_choices, method="filter_tags"
     )
     is_in_shopping_cart = django_filters.NumberFilter(
         method="filter_is_in_shopping_cart"
     )
     is_favorited = django_filters.NumberFilter(method="filter_is_favorited")
+    search = django_filters.CharFilter(method="filter_search")
 
     class Meta:
         model = Recipe
-        fields = ("author", "tags", "is_favorited", "is_in_shopping_cart")
+        fields = (
+            "author",
+            "tags",
+            "is_favorited",
+            "is_in_shopping_cart",
+            "search",
+        )
+
+    def filter_tags(self, queryset, name, value):
+        """Фильтрует рецепты по slug тэгов, определяя их id по кэшу."""
+        return queryset.filter(
+            tags__id__in=tag_cache.ids_by_slugs(value)
+        ).distinct()
 
     def filter_is_in_shopping_cart(self, queryset, name, value):
         """Фильтрует рецепты по наличию в списке покупок."""
@@ -36,18 +59,43 @@ class RecipeFilter(django_filters.FilterSet):
             return queryset.filter(favorited_by__user=self.request.user)
         return queryset
 
+    def filter_search(self, queryset, name, value):
+        """Выполняет ранжированный поиск рецептов."""
+        return get_search_backend().search_recipes(queryset, value)
+
 
 class IngredientFilter(django_filters.FilterSet):
     """
     Фильтр для ингредиентов.
 
-    Фильтрует ингредиенты по начальным буквам в названии.
+    Фильтрует ингредиенты по вхождению строки в название: сначала идут
+    совпадения по началу названия, затем по подстроке. Количество
+    результатов ограничено. Параметр search выполняет ранжированный поиск
+    с учетом опечаток.
     """
 
-    name = django_filters.CharFilter(
-        lookup_expr="icontains",
-    )
+    name = django_filters.CharFilter(method="filter_name")
+    search = django_filters.CharFilter(method="filter_search")
 
     class Meta:
         model = Ingredient
-        fields = ("name",)
+        fields = ("name", "search")
+
+    def filter_name(self, queryset, name, value):
+        """Фильтрует ингредиенты по названию с помощью индекса в памяти."""
+        ids = ingredient_index.search(value, MAX_INGREDIENT_SEARCH_RESULTS)
+        if not ids:
+            return queryset.none()
+
+        return queryset.filter(id__in=ids).order_by(
+            Case(
+                *(
+                    When(id=ingredient_id, then=position)
+                    for position, ingredient_id in enumerate(ids)
+                )
+            )
+        )
+
+    def filter_search(self, queryset, name, value):
+        """Выполняет ранжированный поиск ингредиентов."""
+        return get_search_backend().search_ingredients(queryset, value)
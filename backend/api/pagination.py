@@ -1,4 +1,4 @@
-from rest_framework.pagination import PageNumberPagination
+from rest_framework.pagination import CursorPagination, PageNumberPagination
 from rest_framework.settings import api_settings
 
 
@@ -11,3 +11,65 @@ class CustomPagination(PageNumberPagination):
 
     page_size_query_param = "limit"
     page_size = api_settings.PAGE_SIZE
+
+
+class IdCursorPagination(CursorPagination):
+    """
+    Курсорная пагинация по убыванию id.
+
+    Не выполняет COUNT(*) и OFFSET, поэтому время ответа не зависит от
+    глубины страницы.
+    """
+
+    page_size_query_param = "limit"
+    page_size = api_settings.PAGE_SIZE
+    ordering = "-id"
+
+
+class RecipePagination(CustomPagination):
+    """
+    Пагинация рецептов.
+
+    По умолчанию работает постранично. Параметр `pagination=cursor`
+    или наличие параметра `cursor` включает курсорную пагинацию.
+    """
+
+    mode_query_param = "pagination"
+    cursor_mode = "cursor"
+
+    cursor_paginator = None
+
+    def is_cursor_mode(self, request):
+        """Определяет, запрошена ли курсорная пагинация."""
+        return (
+            request.query_params.get(self.mode_query_param)
+            == self.cursor_mode
+            or IdCursorPagination.cursor_query_param in request.query_params
+        )
+
+    def paginate_queryset(self, queryset, request, view=None):
+        """Разбивает queryset на страницы выбранным способом."""
+        if not self.is_cursor_mode(request):
+            self.cursor_paginator = None
+            return super().paginate_queryset(queryset, request, view)
+
+        self.cursor_paginator = IdCursorPagination()
+        page = self.cursor_paginator.paginate_queryset(
+            queryset, request, view
+        )
+        self.display_page_controls = (
+            self.cursor_paginator.display_page_controls
+        )
+        return page
+
+    def get_paginated_response(self, data):
+        """Возвращает ответ в формате выбранной пагинации."""
+        if self.cursor_paginator is not None:
+            return self.cursor_paginator.get_paginated_response(data)
+        return super().get_paginated_response(data)
+
+    def get_html_context(self):
+        """Возвращает контекст элементов управления страницами."""
+        if self.cursor_paginator is not None:
+            return self.cursor_paginator.get_html_context()
+        return super().get_html_context()
@@ -0,0 +1,49 @@
+import json
+
+from rest_framework.renderers import BaseRenderer
+
+
+class ShoppingListRenderer(BaseRenderer):
+    """
+    Базовый рендерер форматов выгрузки списка покупок.
+
+    Сам список отдается потоком в обход рендерера, а ошибки - в формате
+    JSON, поэтому рендерер используется только для согласования формата.
+    """
+
+    charset = "utf-8"
+
+    def render(self, data, accepted_media_type=None, renderer_context=None):
+        """Отрисовывает данные ответа в виде JSON."""
+        if data is None:
+            return b""
+        return json.dumps(data, ensure_ascii=False).encode("utf-8")
+
+
+class PDFRenderer(ShoppingListRenderer):
+    """Рендерер списка покупок в формате PDF."""
+
+    media_type = "application/pdf"
+    format = "pdf"
+    charset = None
+
+
+class PlainTextRenderer(ShoppingListRenderer):
+    """Рендерер списка покупок в текстовом формате."""
+
+    media_type = "text/plain"
+    format = "txt"
+
+
+class CSVRenderer(ShoppingListRenderer):
+    """Рендерер списка покупок в формате CSV."""
+
+    media_type = "text/csv"
+    format = "csv"
+
+
+class ShoppingListJSONRenderer(ShoppingListRenderer):
+    """Рендерер списка покупок в формате JSON."""
+
+    media_type = "application/json"
+    format = "json"
@@ -0,0 +1,144 @@
+import heapq
+from bisect import bisect_left
+
+from django.contrib.postgres.search import (
+    SearchQuery,
+    SearchRank,
+    TrigramSimilarity
+)
+from django.db import connection
+from django.db.models import F, Q, Value
+
+from foodgram.constants import SEARCH_CONFIG
+from recipes.models import Ingredient
+
+from .cache import VersionedProcessCache
+
+
+class IngredientIndex(VersionedProcessCache):
+    """
+    Индекс названий ингредиентов в памяти процесса.
+
+    Хранит отсортированные названия в нижнем регистре, поэтому совпадения по
+    началу названия находятся двоичным поиском, а совпадения по подстроке -
+    одним проходом по списку без обращения к базе данных. Индекс строится при
+    первом поиске и перестраивается при смене версии таблицы ингредиентов.
+    """
+
+    table = "ingredients"
+
+    def load(self):
+        """Загружает из базы отсортированные названия и id ингредиентов."""
+        rows = sorted(
+            (name.casefold(), ingredient_id)
+            for ingredient_id, name in Ingredient.objects.values_list(
+                "id", "name"
+            )
+        )
+        return (
+            [name for name, _ in rows],
+            [ingredient_id for _, ingredient_id in rows],
+        )
+
+    def search(self, query, limit):
+        """
+        Возвращает id ингредиентов, название которых содержит query.
+
+        Сначала идут названия, начинающиеся с query, в алфавитном порядке,
+        затем остальные совпадения по позиции вхождения и алфавиту.
+        """
+        names, ids = self.get_data()
+        query = query.casefold()
+
+        result = []
+        position = bisect_left(names, query)
+        while (
+            position < len(names)
+            and len(result) < limit
+            and names[position].startswith(query)
+        ):
+            result.append(ids[position])
+            position += 1
+
+        if len(result) < limit:
+            substring_matches = heapq.nsmallest(
+                limit - len(result),
+                (
+                    (found, name, ingredient_id)
+                    for name, ingredient_id in zip(names, ids)
+                    if (found := name.find(query)) > 0
+                ),
+            )
+            result.extend(
+                ingredient_id for _, _, ingredient_id in substring_matches
+            )
+
+        return result
+
+
+ingredient_index = IngredientIndex()
+
+
+class SimpleSearchBackend:
+    """
+    Поиск по вхождению подстроки.
+
+    Используется для баз данных без полнотекстового поиска, например SQLite.
+    Сохраняет интерфейс полнотекстового поиска, но не ранжирует результаты.
+    """
+
+    def search_recipes(self, queryset, value):
+        """Ищет рецепты по названию и описанию."""
+        return queryset.filter(
+            Q(name__icontains=value) | Q(text__icontains=value)
+        ).annotate(rank=Value(0.0))
+
+    def search_ingredients(self, queryset, value):
+        """Ищет ингредиенты по названию."""
+        return queryset.filter(name__icontains=value).annotate(
+            rank=Value(0.0)
+        )
+
+
+class PostgresSearchBackend:
+    """
+    Поиск средствами PostgreSQL.
+
+    Рецепты ищутся по полнотекстовому индексу названия и описания, а также
+    по триграммам названия, чтобы находить слова с опечатками. Ингредиенты
+    ищутся по триграммному индексу названия. Результаты ранжируются по
+    релевантности.
+    """
+
+    def search_recipes(self, queryset, value):
+        """Ищет рецепты по названию и описанию."""
+        query = SearchQuery(
+            value, config=SEARCH_CONFIG, search_type="websearch"
+        )
+        return (
+            queryset.filter(
+                Q(search_vector=query) | Q(name__trigram_similar=value)
+            )
+            .annotate(
+                rank=SearchRank(F("search_vector"), query)
+                + TrigramSimilarity("name", value)
+            )
+            .order_by("-rank", "-id")
+        )
+
+    def search_ingredients(self, queryset, value):
+        """Ищет ингредиенты по названию."""
+        return (
+            queryset.filter(
+                Q(name__icontains=value) | Q(name__trigram_similar=value)
+            )
+            .annotate(rank=TrigramSimilarity("name", value))
+            .order_by("-rank", "name")
+        )
+
+
+def get_search_backend():
+    """Возвращает бэкенд поиска для используемой базы данных."""
+    if connection.vendor == "postgresql":
+        return PostgresSearchBackend()
+    return SimpleSearchBackend()
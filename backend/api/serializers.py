@@ -1,53 +1,117 @@
 import base64
 
 from django.core.files.base import ContentFile
+from django.db import models, transaction
 
 import djoser.serializers
 from rest_framework import serializers
-from rest_framework.validators import UniqueTogetherValidator
-
-from foodgram.constants import MIN_AMOUNT, MIN_COOKING_TIME
-from recipes.models import (
-    FavoriteRecipe,
-    Ingredient,
-    Recipe,
-    RecipeIngredient,
-    ShoppingList,
-    Tag
+from rest_framework.permissions import SAFE_METHODS
+
+from foodgram.constants import MAX_BULK_RECIPES, MIN_AMOUNT, MIN_COOKING_TIME
+from foodgram.db_router import use_primary_database
+from recipes.images import get_image_urls
+from recipes.models import Ingredient, Recipe, RecipeIngredient, Tag
+from users.models import User
+
+from .cache import (
+    get_recipe_fragments,
+    get_recipe_versions,
+    set_recipe_fragments,
+    tag_cache
 )
-from users.models import Subscribe, User
+from .utils import create_update_ingredients, sync_recipe_ingredients
 
-from .utils import create_update_ingredients
+RECIPE_IMAGE_SIZES = ("card", "full")
+IMAGE_EXTENSIONS = ("jpeg", "jpg", "png", "gif", "webp", "bmp")
 
 
-class Base64ImageField(serializers.ImageField):
+class Base64ImageField(serializers.FileField):
     """
     Пользовательское поле сериализатора для обработки изображений.
+
+    Изображение только декодируется из base64 и сохраняется как есть:
+    проверка и уменьшение выполняются в фоне после сохранения рецепта.
     """
 
+    default_error_messages = {
+        "invalid_image": "Загрузите изображение в формате base64.",
+    }
+
     def to_internal_value(self, data):
         """
         Преобразует данные изображения в формате base64 в объект `ContentFile`.
         """
         if isinstance(data, str) and data.startswith("data:image"):
-            format, imgstr = data.split(";base64,")
+            try:
+                format, imgstr = data.split(";base64,")
+                content = base64.b64decode(imgstr, validate=True)
+            except ValueError:
+                self.fail("invalid_image")
             ext = format.split("/")[-1]
-            data = ContentFile(base64.b64decode(imgstr), name="temp." + ext)
+            if ext not in IMAGE_EXTENSIONS:
+                self.fail("invalid_image")
+            data = ContentFile(content, name="temp." + ext)
 
         return super().to_internal_value(data)
 
 
+class CachedTagField(serializers.PrimaryKeyRelatedField):
+    """Поле тэга, проверяющее первичный ключ по кэшу тэгов."""
+
+    def to_internal_value(self, data):
+        """Возвращает тэг из кэша по первичному ключу."""
+        try:
+            if isinstance(data, bool):
+                raise TypeError
+            tag = tag_cache.get(int(data))
+        except (TypeError, ValueError):
+            self.fail("incorrect_type", data_type=type(data).__name__)
+        if tag is None:
+            self.fail("does_not_exist", pk_value=data)
+        return tag
+
+
+def build_image_urls(request, urls):
+    """Возвращает абсолютные адреса изображений, если известен запрос."""
+    if request is None:
+        return urls
+    return {
+        image_format: url and request.build_absolute_uri(url)
+        for image_format, url in urls.items()
+    }
+
+
 class RecipeReadSerializer(serializers.ModelSerializer):
-    """Сериализатор для чтения информации о рецептах."""
+    """
+    Сериализатор для чтения информации о рецептах.
 
-    image = Base64ImageField(read_only=True)
+    Используется в кратких карточках рецептов, поэтому возвращает
+    изображение размера preview.
+    """
+
+    image = serializers.SerializerMethodField()
+    image_webp = serializers.SerializerMethodField()
     name = serializers.ReadOnlyField()
     cooking_time = serializers.ReadOnlyField()
 
     class Meta:
-        fields = ("id", "name", "image", "cooking_time")
+        fields = ("id", "name", "image", "image_webp", "cooking_time")
         model = Recipe
 
+    def get_image_urls(self, obj):
+        """Возвращает адреса изображения preview по форматам."""
+        return build_image_urls(
+            self.context.get("request"), get_image_urls(obj, "preview")
+        )
+
+    def get_image(self, obj):
+        """Возвращает адрес изображения в формате JPEG."""
+        return self.get_image_urls(obj)["jpeg"]
+
+    def get_image_webp(self, obj):
+        """Возвращает адрес изображения в формате WebP."""
+        return self.get_image_urls(obj)["webp"]
+
 
 class UserGETSerializer(djoser.serializers.UserSerializer):
     """Сериализатор для чтения информации о пользователях."""
@@ -70,6 +134,9 @@ class UserGETSerializer(djoser.serializers.UserSerializer):
         request = self.context.get("request")
 
         if request and not request.user.is_anonymous:
+            subscriptions = self.context.get("subscriptions")
+            if subscriptions is not None:
+                return obj.id in subscriptions
             user = request.user
             return user.followers.filter(author=obj).exists()
         return False
@@ -94,7 +161,7 @@ class SubscriptionSerializer(serializers.ModelSerializer):
     """Сериализатор для подписок пользователя."""
 
     is_subscribed = serializers.SerializerMethodField(read_only=True)
-    recipes_count = serializers.SerializerMethodField(read_only=True)
+    recipes_count = serializers.ReadOnlyField()
     recipes = serializers.SerializerMethodField(read_only=True)
     email = serializers.ReadOnlyField()
     username = serializers.ReadOnlyField()
@@ -116,27 +183,34 @@ class SubscriptionSerializer(serializers.ModelSerializer):
 
     def get_is_subscribed(self, obj):
         """Возвращает значение поля is_subscribed."""
+        if hasattr(obj, "is_subscribed"):
+            return obj.is_subscribed
+
         request = self.context.get("request")
 
         if request and not request.user.is_anonymous:
+            subscriptions = self.context.get("subscriptions")
+            if subscriptions is not None:
+                return obj.id in subscriptions
             user = request.user
             return user.followers.filter(author=obj).exists()
 
         return False
 
-    def get_recipes_count(self, obj):
-        """Возвращает количество рецептов пользователя."""
-        return Recipe.objects.filter(author=obj).count()
-
     def get_recipes(self, obj):
         """Возвращает информацию о рецептах пользователя."""
-        request = self.context.get("request")
-        recipes_limit = request.query_params.get("recipes_limit", None)
-
-        if recipes_limit is not None:
-            recipes = Recipe.objects.filter(author=obj)[: int(recipes_limit)]
+        if hasattr(obj, "preview_recipes"):
+            recipes = obj.preview_recipes
         else:
-            recipes = Recipe.objects.filter(author=obj)
+            request = self.context.get("request")
+            recipes_limit = request.query_params.get("recipes_limit", None)
+
+            if recipes_limit is not None:
+                recipes = Recipe.objects.filter(author=obj)[
+                    : int(recipes_limit)
+                ]
+            else:
+                recipes = Recipe.objects.filter(author=obj)
 
         serializer = RecipeReadSerializer(
             recipes, many=True, context=self.context
@@ -144,40 +218,6 @@ class SubscriptionSerializer(serializers.ModelSerializer):
         return serializer.data
 
 
-class SubscriptionCreateSerializer(serializers.ModelSerializer):
-    """Сериализатор для создания подписок пользователя."""
-
-    class Meta:
-        model = Subscribe
-        fields = "__all__"
-        validators = [
-            UniqueTogetherValidator(
-                queryset=Subscribe.objects.all(),
-                fields=("user", "author"),
-                message="Вы уже подписаны",
-            )
-        ]
-
-    def validate(self, obj):
-        """Проверяет валидность данных."""
-        user = self.context.get("request").user
-        author = obj["author"]
-
-        if user == author:
-            raise serializers.ValidationError(
-                "Нельзя подписываться на самого себя"
-            )
-
-        return obj
-
-    def to_representation(self, instance):
-        """Преобразует объект подписки в представление."""
-        request = self.context.get("request")
-        return SubscriptionSerializer(
-            instance.author, context={"request": request}
-        ).data
-
-
 class TagSerializer(serializers.ModelSerializer):
     """Сериализатор для модели Tag."""
 
@@ -226,8 +266,74 @@ class RecipeIngredientCreateSerializer(serializers.ModelSerializer):
         model = RecipeIngredient
 
 
+class AuthorFragmentSerializer(serializers.ModelSerializer):
+    """Сериализатор данных автора, не зависящих от пользователя."""
+
+    class Meta:
+        fields = (
+            "id",
+            "email",
+            "username",
+            "first_name",
+            "last_name",
+        )
+        model = User
+
+
+class RecipeFragmentSerializer(serializers.ModelSerializer):
+    """
+    Сериализатор части рецепта, не зависящей от пользователя.
+
+    Результат кэшируется, поэтому сериализатор вызывается без запроса в
+    контексте и возвращает относительные адреса изображений всех размеров,
+    используемых в рецептах.
+    """
+
+    author = AuthorFragmentSerializer(read_only=True)
+    image = serializers.SerializerMethodField()
+    tags = TagSerializer(many=True, read_only=True)
+    ingredients = RecipeIngredientGETSerializer(
+        many=True, read_only=True, source="recipes"
+    )
+
+    class Meta:
+        fields = (
+            "id",
+            "tags",
+            "author",
+            "ingredients",
+            "name",
+            "image",
+            "image_status",
+            "text",
+            "cooking_time",
+        )
+        model = Recipe
+
+    def get_image(self, obj):
+        """Возвращает адреса изображений рецепта по размерам и форматам."""
+        return {
+            size: get_image_urls(obj, size) for size in RECIPE_IMAGE_SIZES
+        }
+
+
+class RecipeGETListSerializer(serializers.ListSerializer):
+    """Сериализатор списка рецептов, собираемого из кэша одним запросом."""
+
+    def to_representation(self, data):
+        """Преобразует рецепты в сериализованный формат."""
+        iterable = data.all() if isinstance(data, models.Manager) else data
+        return self.child.render(list(iterable))
+
+
 class RecipeGETSerializer(serializers.ModelSerializer):
-    """Сериализатор для чтения информации о рецептах."""
+    """
+    Сериализатор для чтения информации о рецептах.
+
+    Общая для всех пользователей часть рецепта берется из кэша, а поверх нее
+    подставляются is_favorited, is_in_shopping_cart и author.is_subscribed.
+    В списке рецептов возвращается изображение размера card, иначе - full.
+    """
 
     author = UserGETSerializer(read_only=True)
     tags = TagSerializer(many=True, read_only=True)
@@ -238,6 +344,7 @@ class RecipeGETSerializer(serializers.ModelSerializer):
     is_in_shopping_cart = serializers.BooleanField(
         read_only=True, default=False
     )
+    image_webp = serializers.CharField(read_only=True)
 
     class Meta:
         fields = (
@@ -249,17 +356,122 @@ class RecipeGETSerializer(serializers.ModelSerializer):
             "is_in_shopping_cart",
             "name",
             "image",
+            "image_webp",
+            "image_status",
             "text",
             "cooking_time",
         )
         model = Recipe
+        list_serializer_class = RecipeGETListSerializer
+
+    def to_representation(self, instance):
+        """Преобразует объект рецепта в сериализованный формат."""
+        return self.render([instance])[0]
+
+    def render(self, recipes):
+        """
+        Собирает представления рецептов из кэшированных фрагментов.
+
+        Недостающие фрагменты собираются из рецептов, перечитанных после
+        чтения их версий, и сохраняются под этими версиями.
+        """
+        use_cache = self.uses_fragment_cache()
+        versions = (
+            get_recipe_versions(recipe.id for recipe in recipes)
+            if use_cache
+            else {}
+        )
+        fragments = get_recipe_fragments(versions) if use_cache else {}
+        missing = [recipe for recipe in recipes if recipe.id not in fragments]
+        if missing:
+            fresh = self.load_fragment_rows(missing) if use_cache else missing
+            built = {
+                recipe.id: RecipeFragmentSerializer(recipe).data
+                for recipe in fresh
+            }
+            if use_cache:
+                set_recipe_fragments(built, versions)
+            fragments.update(built)
+            # Рецепты, уже удаленные в основной БД, собираются без кэша.
+            fragments.update(
+                (recipe.id, RecipeFragmentSerializer(recipe).data)
+                for recipe in missing
+                if recipe.id not in fragments
+            )
+
+        return [
+            self.apply_user_fields(recipe, fragments[recipe.id])
+            for recipe in recipes
+        ]
+
+    def load_fragment_rows(self, recipes):
+        """
+        Перечитывает рецепты для кэша фрагментов из основной БД.
+
+        Кэш общий для всех пользователей, поэтому в него нельзя класть
+        данные из реплики: она может отставать от уже сброшенного кэша.
+        Рецепты, загруженные представлением до чтения версий, тоже не
+        подходят: они могли измениться между загрузкой и чтением версий.
+        """
+        with use_primary_database():
+            return list(
+                Recipe.objects.filter(id__in=[recipe.id for recipe in recipes])
+                .select_related("author")
+                .prefetch_related(
+                    "tags",
+                    models.Prefetch(
+                        "recipes",
+                        queryset=RecipeIngredient.objects.select_related(
+                            "ingredient"
+                        ),
+                    ),
+                )
+            )
+
+    def apply_user_fields(self, recipe, fragment):
+        """Дополняет фрагмент рецепта полями текущего пользователя."""
+        request = self.context.get("request")
+        data = dict(fragment)
+        data["author"] = dict(
+            fragment["author"],
+            is_subscribed=self.fields["author"].get_is_subscribed(
+                recipe.author
+            ),
+        )
+        data["is_favorited"] = getattr(recipe, "is_favorited", False)
+        data["is_in_shopping_cart"] = getattr(
+            recipe, "is_in_shopping_cart", False
+        )
+        image_urls = build_image_urls(
+            request, fragment["image"][self.get_image_size()]
+        )
+        data["image"] = image_urls["jpeg"]
+        data["image_webp"] = image_urls["webp"]
+
+        return {field: data[field] for field in self.Meta.fields}
+
+    def uses_fragment_cache(self):
+        """
+        Проверяет, можно ли работать с кэшем фрагментов.
+
+        Кэш используется только при чтении рецептов. Ответ на создание или
+        изменение рецепта собирается из объекта в памяти, который к этому
+        моменту может устареть: например, изображение уже обработано.
+        """
+        request = self.context.get("request")
+        return request is not None and request.method in SAFE_METHODS
+
+    def get_image_size(self):
+        """Возвращает размер изображения: card для списка, иначе full."""
+        view = self.context.get("view")
+        return "card" if getattr(view, "action", None) == "list" else "full"
 
 
 class RecipeCreateSerializer(serializers.ModelSerializer):
     """Сериализатор для создания и обновления рецептов."""
 
     image = Base64ImageField(required=True)
-    tags = serializers.PrimaryKeyRelatedField(
+    tags = CachedTagField(
         queryset=Tag.objects.all(), many=True, required=True
     )
     ingredients = RecipeIngredientCreateSerializer(many=True, required=True)
@@ -300,14 +512,20 @@ class RecipeCreateSerializer(serializers.ModelSerializer):
                 raise serializers.ValidationError(
                     f"Количество ингредиента не может быть меньше {MIN_AMOUNT}"
                 )
-            if not Ingredient.objects.filter(id=ingredient_id).exists():
-                raise serializers.ValidationError("Ингредиент не существует")
             if ingredient_id in ingredients_list:
                 raise serializers.ValidationError(
                     "Ингредиент уже добавлен в рецепт"
                 )
             ingredients_list.add(ingredient_id)
 
+        existing_ingredients = set(
+            Ingredient.objects.filter(id__in=ingredients_list).values_list(
+                "id", flat=True
+            )
+        )
+        if existing_ingredients != ingredients_list:
+            raise serializers.ValidationError("Ингредиент не существует")
+
         if cooking_time < MIN_COOKING_TIME:
             raise serializers.ValidationError(
                 f"Время готовки не может быть менее {MIN_COOKING_TIME} мин"
@@ -315,6 +533,7 @@ class RecipeCreateSerializer(serializers.ModelSerializer):
 
         return obj
 
+    @transaction.atomic
     def create(self, validated_data):
         """Создает новый рецепт."""
         user = self.context.get("request").user
@@ -329,76 +548,50 @@ class RecipeCreateSerializer(serializers.ModelSerializer):
 
         return recipe
 
+    @transaction.atomic
     def update(self, instance, validated_data):
-        """Обновляет рецепт."""
-        instance.image = validated_data.get("image", instance.image)
-        instance.name = validated_data.get("name", instance.name)
-        instance.text = validated_data.get("text", instance.text)
-        instance.cooking_time = validated_data.get(
-            "cooking_time", instance.cooking_time
-        )
+        """
+        Обновляет рецепт.
+
+        Тэги и ингредиенты обновляются по разнице с текущими, а в базу
+        записываются только изменившиеся поля рецепта.
+        """
         ingredients_data = validated_data.pop("ingredients")
         tags = validated_data.pop("tags")
 
-        instance.tags.clear()
-        instance.tags.set(tags)
-
-        RecipeIngredient.objects.filter(recipe=instance).delete()
+        update_fields = [
+            field
+            for field, value in validated_data.items()
+            if field == "image" or getattr(instance, field) != value
+        ]
+        for field in update_fields:
+            setattr(instance, field, validated_data[field])
 
-        create_update_ingredients(instance, ingredients_data)
+        instance.tags.set(tags)
+        sync_recipe_ingredients(instance, ingredients_data)
 
-        instance.save()
+        if update_fields:
+            instance.save(update_fields=update_fields)
         return instance
 
     def to_representation(self, instance):
         """Преобразует объект рецепта в сериализованный формат."""
+        models.prefetch_related_objects(
+            [instance],
+            "tags",
+            models.Prefetch(
+                "recipes",
+                queryset=RecipeIngredient.objects.select_related("ingredient"),
+            ),
+        )
         return RecipeGETSerializer(instance, context=self.context).data
 
 
-class FavoriteSerializer(serializers.ModelSerializer):
-    """Серилизатор для избранных рецептов."""
-
-    class Meta:
-        fields = ("recipe", "user")
-        model = FavoriteRecipe
-
-    def validate(self, obj):
-        """Проверяет валидность данных."""
-        user = obj["user"]
-
-        if user.favorite_recipes.filter(recipe=obj["recipe"]).exists():
-            raise serializers.ValidationError(
-                "Рецепт уже добавлен в избранное."
-            )
-        return obj
-
-    def to_representation(self, instance):
-        """Преобразует объект избранного рецепта в сериализованный формат."""
-        request = self.context.get("request")
-        return RecipeReadSerializer(
-            instance.recipe, context={"request": request}
-        ).data
-
-
-class ShoppingListSerializer(serializers.ModelSerializer):
-    """Серилизатор для списка покупок."""
-
-    class Meta:
-        fields = ("recipe", "user")
-        model = ShoppingList
-
-    def validate(self, obj):
-        """Проверяет валидность данных."""
-        user = obj["user"]
+class RecipeIdsSerializer(serializers.Serializer):
+    """Сериализатор списка id рецептов для массовых операций."""
 
-        if user.shopping_lists.filter(recipe=obj["recipe"]).exists():
-            raise serializers.ValidationError("Рецепт уже добавлен в корзину")
-
-        return obj
-
-    def to_representation(self, instance):
-        """Преобразует объект списка покупок в сериализованный формат."""
-        request = self.context.get("request")
-        return RecipeReadSerializer(
-            instance.recipe, context={"request": request}
-        ).data
+    recipes = serializers.ListField(
+        child=serializers.IntegerField(min_value=1),
+        allow_empty=False,
+        max_length=MAX_BULK_RECIPES,
+    )
@@ -0,0 +1,123 @@
+from django.db import transaction
+from django.db.models.signals import (
+    m2m_changed,
+    post_delete,
+    post_save,
+    pre_delete
+)
+from django.dispatch import receiver
+
+from recipes.models import (
+    FavoriteRecipe,
+    Ingredient,
+    Recipe,
+    RecipeIngredient,
+    ShoppingList,
+    Tag
+)
+from users.models import Subscribe, User
+
+from .cache import invalidate_recipe_fragments, tag_cache, touch_tables
+
+AUTHOR_FRAGMENT_FIELDS = frozenset(
+    ("id", "email", "username", "first_name", "last_name")
+)
+
+TABLE_VERSIONS = {
+    Recipe: "recipes",
+    RecipeIngredient: "recipes",
+    Tag: "tags",
+    Ingredient: "ingredients",
+    FavoriteRecipe: "favorites",
+    ShoppingList: "shopping_lists",
+    Subscribe: "subscriptions",
+}
+
+
+def touch_model_table(sender, **kwargs):
+    """Обновляет версию таблицы измененной модели."""
+    touch_tables(TABLE_VERSIONS[sender])
+
+
+for model in TABLE_VERSIONS:
+    dispatch_uid = f"touch_{model._meta.label_lower}"
+    post_save.connect(
+        touch_model_table, sender=model, dispatch_uid=dispatch_uid
+    )
+    post_delete.connect(
+        touch_model_table, sender=model, dispatch_uid=dispatch_uid
+    )
+
+
+@receiver(post_save, sender=Recipe)
+@receiver(post_delete, sender=Recipe)
+def invalidate_recipe(sender, instance, **kwargs):
+    """Сбрасывает кэш рецепта при его изменении или удалении."""
+    invalidate_recipe_fragments([instance.id])
+
+
+@receiver(post_save, sender=RecipeIngredient)
+@receiver(post_delete, sender=RecipeIngredient)
+def invalidate_recipe_ingredient(sender, instance, **kwargs):
+    """Сбрасывает кэш рецепта при изменении его ингредиентов."""
+    invalidate_recipe_fragments([instance.recipe_id])
+
+
+@receiver(m2m_changed, sender=Recipe.tags.through)
+def invalidate_recipe_tags(
+    sender, instance, action, reverse, pk_set, **kwargs
+):
+    """Сбрасывает кэш рецептов при изменении их тэгов."""
+    if action.startswith("post_"):
+        touch_tables("recipes")
+
+    if not reverse:
+        if action.startswith("post_"):
+            invalidate_recipe_fragments([instance.id])
+    elif action in ("post_add", "post_remove"):
+        invalidate_recipe_fragments(pk_set)
+    elif action == "pre_clear":
+        invalidate_recipe_fragments(
+            instance.recipe_set.values_list("id", flat=True)
+        )
+
+
+@receiver(post_save, sender=Tag)
+@receiver(pre_delete, sender=Tag)
+def invalidate_tag(sender, instance, **kwargs):
+    """Сбрасывает кэш рецептов с измененным тэгом."""
+    invalidate_recipe_fragments(
+        instance.recipe_set.values_list("id", flat=True)
+    )
+
+
+@receiver(post_save, sender=Tag)
+@receiver(post_delete, sender=Tag)
+def clear_tag_cache(sender, instance, **kwargs):
+    """Сбрасывает кэш тэгов процесса после изменения тэга."""
+    transaction.on_commit(tag_cache.clear)
+
+
+@receiver(post_save, sender=Ingredient)
+def invalidate_ingredient(sender, instance, **kwargs):
+    """Сбрасывает кэш рецептов с измененным ингредиентом."""
+    invalidate_recipe_fragments(
+        instance.ingredients.values_list("recipe_id", flat=True)
+    )
+
+
+@receiver(post_delete, sender=User)
+def touch_users(sender, instance, **kwargs):
+    """Обновляет версию таблицы пользователей при удалении."""
+    touch_tables("users")
+
+
+@receiver(post_save, sender=User)
+def invalidate_author(sender, instance, update_fields, **kwargs):
+    """Сбрасывает кэш рецептов автора при изменении его данных."""
+    if update_fields and AUTHOR_FRAGMENT_FIELDS.isdisjoint(update_fields):
+        return
+    touch_tables("users")
+    invalidate_recipe_fragments(
+        instance.recipes.values_list("id", flat=True)
+    )
@@ -0,0 +1,228 @@
+import base64
+import io
+import shutil
+import tempfile
+
+from django.conf import settings
+from django.test import TestCase, override_settings
+
+from PIL import Image
+from rest_framework.test import APIClient
+
+from recipes.models import Ingredient, Recipe, RecipeIngredient, Tag
+from users.models import User
+
+from .cache import get_recipes_cache, tag_cache
+
+PAGE_SIZES = (6, 50, 200)
+RECIPES_COUNT = max(PAGE_SIZES)
+INGREDIENTS_PER_RECIPE = 3
+INGREDIENT_COUNTS = (2, 10, 30)
+
+
+def make_image():
+    """Возвращает изображение PNG в формате data URI."""
+    buffer = io.BytesIO()
+    Image.new("RGB", (8, 8), "white").save(buffer, "PNG")
+    return "data:image/png;base64," + base64.b64encode(
+        buffer.getvalue()
+    ).decode()
+
+
+IMAGE = make_image()
+
+
+class RecipeQueryCountTest(TestCase):
+    """Число запросов к базе при чтении рецептов не зависит от их числа."""
+
+    @classmethod
+    def setUpTestData(cls):
+        cls.user = User.objects.create_user(
+            email="reader@example.com",
+            username="reader",
+            first_name="Reader",
+            last_name="Reader",
+            password="password",
+        )
+        author = User.objects.create_user(
+            email="author@example.com",
+            username="author",
+            first_name="Author",
+            last_name="Author",
+            password="password",
+        )
+        Tag.objects.bulk_create(
+            Tag(name=f"Тэг {number}", color="#000000", slug=f"tag{number}")
+            for number in range(2)
+        )
+        Ingredient.objects.bulk_create(
+            Ingredient(name=f"Ингредиент {number}", measurement_unit="г")
+            for number in range(INGREDIENTS_PER_RECIPE)
+        )
+        Recipe.objects.bulk_create(
+            Recipe(
+                author=author,
+                name=f"Рецепт {number}",
+                text="Описание",
+                image="recipes/images/recipe.jpg",
+                cooking_time=10,
+            )
+            for number in range(RECIPES_COUNT)
+        )
+        tags = list(Tag.objects.all())
+        ingredients = list(Ingredient.objects.all())
+        recipes = list(Recipe.objects.order_by("id"))
+        Recipe.tags.through.objects.bulk_create(
+            Recipe.tags.through(recipe_id=recipe.id, tag_id=tag.id)
+            for recipe in recipes
+            for tag in tags
+        )
+        RecipeIngredient.objects.bulk_create(
+            RecipeIngredient(recipe=recipe, ingredient=ingredient, amount=100)
+            for recipe in recipes
+            for ingredient in ingredients
+        )
+        cls.recipe = recipes[0]
+
+    def setUp(self):
+        self.anonymous = APIClient()
+        self.client = APIClient()
+        self.client.force_authenticate(self.user)
+
+    def get(self, client, url, queries, clear_cache=True):
+        """Выполняет GET-запрос, проверяя число запросов к базе."""
+        if clear_cache:
+            get_recipes_cache().clear()
+            tag_cache.clear()
+        with self.assertNumQueries(queries):
+            response = client.get(url)
+        self.assertEqual(response.status_code, 200)
+        return response
+
+    def test_list(self):
+        """Список рецептов читается одним и тем же числом запросов."""
+        for client, queries in ((self.anonymous, 6), (self.client, 7)):
+            for page_size in PAGE_SIZES:
+                with self.subTest(
+                    authenticated=client is self.client, page_size=page_size
+                ):
+                    response = self.get(
+                        client,
+                        f"/api/recipes/?limit={page_size}",
+                        queries,
+                    )
+                    self.assertEqual(
+                        len(response.data["results"]), page_size
+                    )
+
+    def test_retrieve(self):
+        """Рецепт читается фиксированным числом запросов."""
+        url = f"/api/recipes/{self.recipe.id}/"
+        for client, queries in ((self.anonymous, 5), (self.client, 6)):
+            with self.subTest(authenticated=client is self.client):
+                response = self.get(client, url, queries)
+                self.assertEqual(
+                    len(response.data["ingredients"]), INGREDIENTS_PER_RECIPE
+                )
+
+    def test_list_from_fragment_cache(self):
+        """Закэшированные рецепты читаются без тэгов и ингредиентов."""
+        url = f"/api/recipes/?limit={RECIPES_COUNT}"
+        self.get(self.client, url, 7)
+        for client, queries in ((self.anonymous, 2), (self.client, 3)):
+            with self.subTest(authenticated=client is self.client):
+                response = self.get(client, url, queries, clear_cache=False)
+                self.assertEqual(
+                    len(response.data["results"][0]["ingredients"]),
+                    INGREDIENTS_PER_RECIPE,
+                )
+
+
+@override_settings(MEDIA_ROOT=tempfile.mkdtemp())
+class RecipeWriteQueryCountTest(TestCase):
+    """Число запросов при записи рецепта не зависит от числа ингредиентов."""
+
+    @classmethod
+    def setUpTestData(cls):
+        cls.author = User.objects.create_user(
+            email="author@example.com",
+            username="author",
+            first_name="Author",
+            last_name="Author",
+            password="password",
+        )
+        cls.tag = Tag.objects.create(name="Тэг", color="#000000", slug="tag")
+        Ingredient.objects.bulk_create(
+            Ingredient(name=f"Ингредиент {number}", measurement_unit="г")
+            for number in range(max(INGREDIENT_COUNTS) * 2)
+        )
+        cls.ingredient_ids = list(
+            Ingredient.objects.values_list("id", flat=True)
+        )
+
+    @classmethod
+    def tearDownClass(cls):
+        shutil.rmtree(settings.MEDIA_ROOT, ignore_errors=True)
+        super().tearDownClass()
+
+    def setUp(self):
+        self.client = APIClient()
+        self.client.force_authenticate(self.author)
+        get_recipes_cache().clear()
+        tag_cache.clear()
+        tag_cache.all()
+
+    def payload(self, ingredient_ids, amount=10):
+        """Возвращает данные рецепта с указанными ингредиентами."""
+        return {
+            "name": "Рецепт",
+            "text": "Описание",
+            "cooking_time": 10,
+            "image": IMAGE,
+            "tags": [self.tag.id],
+            "ingredients": [
+                {"id": ingredient_id, "amount": amount}
+                for ingredient_id in ingredient_ids
+            ],
+        }
+
+    def create(self, ingredients_count):
+        """Создает рецепт и возвращает его id."""
+        response = self.client.post(
+            "/api/recipes/",
+            self.payload(self.ingredient_ids[:ingredients_count]),
+            format="json",
+        )
+        self.assertEqual(response.status_code, 201)
+        return response.data["id"]
+
+    def test_create(self):
+        """Рецепт создается фиксированным числом запросов."""
+        for ingredients_count in INGREDIENT_COUNTS:
+            with self.subTest(ingredients_count=ingredients_count):
+                with self.assertNumQueries(12):
+                    self.create(ingredients_count)
+
+    def test_update(self):
+        """Ингредиенты рецепта обновляются фиксированным числом запросов."""
+        for ingredients_count in INGREDIENT_COUNTS:
+            with self.subTest(ingredients_count=ingredients_count):
+                recipe_id = self.create(ingredients_count)
+                ingredient_ids = self.ingredient_ids[
+                    ingredients_count // 2:ingredients_count * 3 // 2
+                ]
+                data = self.payload(ingredient_ids, amount=20)
+                data.pop("image")
+                with self.assertNumQueries(16):
+                    response = self.client.patch(
+                        f"/api/recipes/{recipe_id}/", data, format="json"
+                    )
+                self.assertEqual(response.status_code, 200)
+                self.assertEqual(
+                    sorted(
+                        RecipeIngredient.objects.filter(
+                            recipe_id=recipe_id
+                        ).values_list("ingredient_id", flat=True)
+                    ),
+                    sorted(ingredient_ids),
+                )
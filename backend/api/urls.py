@@ -8,7 +8,8 @@ from .views import (
     RecipeViewSet,
     SubscribeView,
     SubscriptionsListView,
-    TagViewSet
+    TagViewSet,
+    UserViewSet
 )
 
 router = routers.DefaultRouter()
@@ -16,6 +17,7 @@ router = routers.DefaultRouter()
 router.register(r"tags", TagViewSet, basename="tags")
 router.register(r"recipes", RecipeViewSet, basename="recipes")
 router.register(r"ingredients", IngredientViewSet, basename="ingredients")
+router.register(r"users", UserViewSet, basename="users")
 
 
 user_urls = [
@@ -31,6 +33,5 @@ user_urls = [
 urlpatterns = [
     path("users/", include(user_urls)),
     path("", include(router.urls)),
-    path("", include("djoser.urls")),
     path("auth/", include("djoser.urls.authtoken")),
 ]
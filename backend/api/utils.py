@@ -1,89 +1,616 @@
-from django.http import HttpResponse
+import csv
+import hashlib
+import io
+import json
+from functools import lru_cache
+
+from django.conf import settings
+from django.db import connection, transaction
+from django.http import Http404
 from django.shortcuts import get_object_or_404
 
+from reportlab.lib.pagesizes import A4
 from reportlab.pdfbase import pdfmetrics
 from reportlab.pdfbase.ttfonts import TTFont
 from reportlab.pdfgen import canvas
 from rest_framework import status
 from rest_framework.response import Response
+from rest_framework.settings import api_settings
+
+from recipes.counters import count_subquery, shift_counter
+from recipes.models import (
+    FavoriteRecipe,
+    Recipe,
+    RecipeIngredient,
+    ShoppingList
+)
+from recipes.shopping_lists import apply_shopping_list_delta
+from users.models import Subscribe, User
+
+from .cache import (
+    invalidate_recipe_fragments,
+    shopping_list_cache,
+    touch_tables
+)
+
+PDF_FONT_NAME = "Arial"
+PDF_FONT_PATH = settings.BASE_DIR / "recipes" / "fonts" / "arial.ttf"
+PDF_FONT_SIZE = 15
+PDF_MARGIN_LEFT = 100
+PDF_TOP = 800
+PDF_MARGIN_BOTTOM = 50
+PDF_LINE_HEIGHT = 20
+
+
+RECIPE_LIST_TABLES = {
+    FavoriteRecipe: "favorites",
+    ShoppingList: "shopping_lists",
+}
+
+
+DUPLICATE_ERRORS = {
+    FavoriteRecipe: "Рецепт уже добавлен в избранное.",
+    ShoppingList: "Рецепт уже добавлен в корзину",
+}
 
-from recipes.models import Ingredient, Recipe, RecipeIngredient
+RECIPE_PROJECTION = ("id", "name", "image", "image_status", "cooking_time")
 
 
+def insert_favorite_or_shopping_list(user, model, recipe_id):
+    """
+    Добавляет рецепт в избранное или список покупок без гонки с дублями.
+
+    Возвращает пару (рецепт, добавлен ли он сейчас); если рецепта нет -
+    (None, False). В PostgreSQL вставка INSERT ... ON CONFLICT DO NOTHING
+    RETURNING и выборка полей рецепта выполняются одним запросом, в
+    остальных СУБД - двумя.
+    """
+    table = model._meta.db_table
+    recipe_table = Recipe._meta.db_table
+    columns = ", ".join(f"r.{column}" for column in RECIPE_PROJECTION)
+    insert = (
+        f"INSERT INTO {table} (user_id, recipe_id) "
+        f"SELECT %s, r.id FROM {recipe_table} r WHERE r.id = %s "
+        "ON CONFLICT (user_id, recipe_id) DO NOTHING RETURNING recipe_id"
+    )
+
+    if connection.vendor == "postgresql":
+        recipes = list(
+            Recipe.objects.raw(
+                f"WITH inserted AS ({insert}) "
+                f"SELECT {columns}, EXISTS(SELECT 1 FROM inserted) AS created "
+                f"FROM {recipe_table} r WHERE r.id = %s",
+                (user.id, recipe_id, recipe_id),
+            )
+        )
+        if not recipes:
+            return None, False
+        return recipes[0], recipes[0].created
+
+    with connection.cursor() as cursor:
+        cursor.execute(insert, (user.id, recipe_id))
+        created = cursor.fetchone() is not None
+    recipe = (
+        Recipe.objects.filter(id=recipe_id).only(*RECIPE_PROJECTION).first()
+    )
+    return recipe, created
+
+
+def delete_favorite_or_shopping_list(user, model, recipe_id):
+    """
+    Удаляет рецепт из избранного или списка покупок запросом DELETE ...
+    RETURNING. Возвращает True, если рецепт был удален.
+    """
+    with connection.cursor() as cursor:
+        cursor.execute(
+            f"DELETE FROM {model._meta.db_table} "
+            "WHERE user_id = %s AND recipe_id = %s RETURNING recipe_id",
+            (user.id, recipe_id),
+        )
+        return cursor.fetchone() is not None
+
+
+def parse_recipe_id(pk):
+    """Возвращает id рецепта из адреса или None, если он не число."""
+    try:
+        return int(pk)
+    except (TypeError, ValueError):
+        return None
+
+
+@transaction.atomic
 def add_favorite_or_shopping_list(request, user, model, serializer_class, pk):
-    """Добавляет рецепт в избранное или список покупок."""
-    if not (recipe := Recipe.objects.filter(id=pk).first()):
+    """
+    Добавляет рецепт в избранное или список покупок.
+
+    Вставка выполняется без сигналов, поэтому счетчик избранного,
+    суммарный список покупок и версия таблицы обновляются явно.
+    """
+    recipe_id = parse_recipe_id(pk)
+    if recipe_id is None:
         return Response(status=status.HTTP_400_BAD_REQUEST)
 
-    serializer = serializer_class(
-        data={"user": user.id, "recipe": recipe.id},
-        context={"request": request},
-    )
-    serializer.is_valid(raise_exception=True)
-    serializer.save(user=user, recipe=recipe)
+    recipe, created = insert_favorite_or_shopping_list(user, model, recipe_id)
+    if recipe is None:
+        return Response(status=status.HTTP_400_BAD_REQUEST)
+    if not created:
+        return Response(
+            {api_settings.NON_FIELD_ERRORS_KEY: [DUPLICATE_ERRORS[model]]},
+            status=status.HTTP_400_BAD_REQUEST,
+        )
+
+    if model is FavoriteRecipe:
+        shift_counter(
+            Recipe.objects.filter(pk=recipe_id), "favorites_count", 1
+        )
+    else:
+        apply_shopping_list_delta(1, [recipe_id], user.id)
+    touch_tables(RECIPE_LIST_TABLES[model])
 
+    serializer = serializer_class(recipe, context={"request": request})
     return Response(serializer.data, status=status.HTTP_201_CREATED)
 
 
+@transaction.atomic
 def remove_favorite_or_shopping_list(user, model, pk):
-    """Удаляет рецепт из избранного или списка покупок."""
-    recipe = get_object_or_404(Recipe, id=pk)
+    """
+    Удаляет рецепт из избранного или списка покупок.
+
+    Удаление выполняется без сигналов, поэтому счетчик избранного,
+    суммарный список покупок и версия таблицы обновляются явно и только
+    если строка действительно удалена этим запросом.
+    """
+    recipe_id = parse_recipe_id(pk)
+    if recipe_id is None:
+        raise Http404
 
-    recipe_delete = model.objects.filter(user=user, recipe=recipe)
-    if not recipe_delete.exists():
+    if not delete_favorite_or_shopping_list(user, model, recipe_id):
+        get_object_or_404(Recipe, id=recipe_id)
         return Response(
             {"ошибка": "рецепт не найден в избранном или списке покупок"},
             status=status.HTTP_400_BAD_REQUEST,
         )
 
-    recipe_delete.delete()
+    if model is FavoriteRecipe:
+        shift_counter(
+            Recipe.objects.filter(pk=recipe_id), "favorites_count", -1
+        )
+    else:
+        apply_shopping_list_delta(-1, [recipe_id], user.id)
+    touch_tables(RECIPE_LIST_TABLES[model])
     return Response(status=status.HTTP_204_NO_CONTENT)
 
 
+AUTHOR_CARD_FIELDS = (
+    "id",
+    "email",
+    "username",
+    "first_name",
+    "last_name",
+    "recipes_count",
+)
+
+
+def insert_subscription(user, author_id):
+    """
+    Подписывает пользователя на автора одним конфликтобезопасным запросом.
+
+    Счетчик подписчиков автора увеличивается запросом UPDATE ...
+    RETURNING, который сразу возвращает поля карточки автора. В
+    PostgreSQL вставка и обновление выполняются одним запросом. Возвращает
+    автора или None, если автора нет или подписка уже существует.
+    """
+    subscribe_table = Subscribe._meta.db_table
+    user_table = User._meta.db_table
+    insert = (
+        f"INSERT INTO {subscribe_table} (user_id, author_id) "
+        f"SELECT %s, u.id FROM {user_table} u WHERE u.id = %s "
+        "ON CONFLICT (user_id, author_id) DO NOTHING RETURNING author_id"
+    )
+    update = (
+        f"UPDATE {user_table} SET followers_count = followers_count + 1 "
+        "WHERE id IN ({}) RETURNING " + ", ".join(AUTHOR_CARD_FIELDS)
+    )
+
+    if connection.vendor == "postgresql":
+        authors = User.objects.raw(
+            f"WITH inserted AS ({insert}) "
+            + update.format("SELECT author_id FROM inserted"),
+            (user.id, author_id),
+        )
+        return next(iter(authors), None)
+
+    with connection.cursor() as cursor:
+        cursor.execute(insert, (user.id, author_id))
+        if cursor.fetchone() is None:
+            return None
+    return next(iter(User.objects.raw(update.format("%s"), (author_id,))))
+
+
+def delete_subscription(user, author_id):
+    """
+    Отписывает пользователя от автора запросом DELETE ... RETURNING.
+
+    Возвращает True, если подписка была удалена; в этом случае счетчик
+    подписчиков автора уменьшается.
+    """
+    with connection.cursor() as cursor:
+        cursor.execute(
+            f"DELETE FROM {Subscribe._meta.db_table} "
+            "WHERE user_id = %s AND author_id = %s RETURNING author_id",
+            (user.id, author_id),
+        )
+        if cursor.fetchone() is None:
+            return False
+
+    shift_counter(User.objects.filter(pk=author_id), "followers_count", -1)
+    return True
+
+
+def bulk_insert_favorite_or_shopping_list(user, model, recipe_ids):
+    """
+    Добавляет рецепты в избранное или список покупок запросом INSERT ...
+    ON CONFLICT DO NOTHING RETURNING.
+
+    Возвращает множество id рецептов, добавленных именно этим запросом:
+    рецепты, уже добавленные параллельным запросом, в него не попадают.
+    """
+    placeholders = ", ".join(["%s"] * len(recipe_ids))
+    with connection.cursor() as cursor:
+        cursor.execute(
+            f"INSERT INTO {model._meta.db_table} (user_id, recipe_id) "
+            f"SELECT %s, r.id FROM {Recipe._meta.db_table} r "
+            f"WHERE r.id IN ({placeholders}) "
+            "ON CONFLICT (user_id, recipe_id) DO NOTHING RETURNING recipe_id",
+            (user.id, *recipe_ids),
+        )
+        return {recipe_id for recipe_id, in cursor.fetchall()}
+
+
+def bulk_delete_favorite_or_shopping_list(user, model, recipe_ids):
+    """
+    Удаляет рецепты из избранного или списка покупок запросом DELETE ...
+    RETURNING. Возвращает множество id удаленных рецептов.
+    """
+    placeholders = ", ".join(["%s"] * len(recipe_ids))
+    with connection.cursor() as cursor:
+        cursor.execute(
+            f"DELETE FROM {model._meta.db_table} "
+            f"WHERE user_id = %s AND recipe_id IN ({placeholders}) "
+            "RETURNING recipe_id",
+            (user.id, *recipe_ids),
+        )
+        return {recipe_id for recipe_id, in cursor.fetchall()}
+
+
+def get_existing_recipe_ids(recipe_ids):
+    """Возвращает множество id рецептов, которые есть в базе."""
+    if not recipe_ids:
+        return set()
+    return set(
+        Recipe.objects.filter(id__in=recipe_ids).values_list("id", flat=True)
+    )
+
+
+def sync_bulk_changes(model, recipe_ids):
+    """
+    Обновляет производные данные после массового изменения.
+
+    Массовые вставка и удаление не отправляют сигналы, поэтому
+    счетчики избранного и версии таблиц обновляются здесь.
+    """
+    if model is FavoriteRecipe:
+        Recipe.objects.filter(id__in=recipe_ids).update(
+            favorites_count=count_subquery(FavoriteRecipe, "recipe")
+        )
+    touch_tables(RECIPE_LIST_TABLES[model])
+
+
+@transaction.atomic
+def bulk_add_favorite_or_shopping_list(user, model, recipe_ids):
+    """
+    Добавляет рецепты в избранное или список покупок одним запросом.
+
+    Суммарный список покупок и счетчики изменяются только для рецептов,
+    которые вернул INSERT, поэтому параллельные добавления не учитываются
+    дважды.
+    """
+    created = bulk_insert_favorite_or_shopping_list(user, model, recipe_ids)
+    if created:
+        if model is ShoppingList:
+            apply_shopping_list_delta(1, created, user.id)
+        sync_bulk_changes(model, created)
+    existing = get_existing_recipe_ids(set(recipe_ids) - created)
+
+    return {
+        recipe_id: (
+            "created"
+            if recipe_id in created
+            else "exists"
+            if recipe_id in existing
+            else "not_found"
+        )
+        for recipe_id in recipe_ids
+    }
+
+
+@transaction.atomic
+def bulk_remove_favorite_or_shopping_list(user, model, recipe_ids):
+    """
+    Удаляет рецепты из избранного или списка покупок одним запросом.
+
+    Суммарный список покупок и счетчики изменяются только для рецептов,
+    которые вернул DELETE.
+    """
+    deleted = bulk_delete_favorite_or_shopping_list(user, model, recipe_ids)
+    if deleted:
+        if model is ShoppingList:
+            apply_shopping_list_delta(-1, deleted, user.id)
+        sync_bulk_changes(model, deleted)
+    existing = get_existing_recipe_ids(set(recipe_ids) - deleted)
+
+    return {
+        recipe_id: (
+            "deleted"
+            if recipe_id in deleted
+            else "absent"
+            if recipe_id in existing
+            else "not_found"
+        )
+        for recipe_id in recipe_ids
+    }
+
+
+def bulk_favorite_or_shopping_list(request, user, model, serializer_class):
+    """
+    Массово добавляет или удаляет рецепты избранного или списка покупок.
+
+    Возвращает статус обработки каждого переданного id рецепта.
+    """
+    serializer = serializer_class(data=request.data)
+    serializer.is_valid(raise_exception=True)
+    recipe_ids = list(dict.fromkeys(serializer.validated_data["recipes"]))
+
+    if request.method == "POST":
+        results = bulk_add_favorite_or_shopping_list(user, model, recipe_ids)
+    else:
+        results = bulk_remove_favorite_or_shopping_list(
+            user, model, recipe_ids
+        )
+
+    return Response(
+        {
+            "recipes": [
+                {"id": recipe_id, "status": result}
+                for recipe_id, result in results.items()
+            ]
+        },
+        status=status.HTTP_200_OK,
+    )
+
+
+def get_subscriptions(user):
+    """Возвращает множество id авторов, на которых подписан пользователь."""
+    if user.is_anonymous:
+        return set()
+    return set(user.followers.values_list("author_id", flat=True))
+
+
 def create_update_ingredients(recipe, ingredients_data):
-    """Создает или обновляет ингредиенты для рецепта."""
-    recipe_ingredients = []
+    """
+    Создает ингредиенты для рецепта.
+
+    Существование ингредиентов проверяется при валидации одним запросом,
+    поэтому строки создаются по id без загрузки объектов Ingredient.
+    """
+    RecipeIngredient.objects.bulk_create(
+        RecipeIngredient(
+            recipe=recipe,
+            ingredient_id=ingredient_data["id"],
+            amount=ingredient_data["amount"],
+        )
+        for ingredient_data in ingredients_data
+    )
 
-    for ingredient_data in ingredients_data:
-        ingredient_id = ingredient_data.get("id")
-        amount = ingredient_data.get("amount")
-        ingredient = get_object_or_404(Ingredient, id=ingredient_id)
 
-        recipe_ingredient = RecipeIngredient(
-            recipe=recipe, ingredient=ingredient, amount=amount
+def sync_recipe_ingredients(recipe, ingredients_data):
+    """
+    Приводит ингредиенты рецепта к переданному списку.
+
+    Новые строки создаются, лишние удаляются, у оставшихся обновляется
+    только изменившееся количество. Суммарные списки покупок, кэш рецепта
+    и версия таблицы рецептов обновляются явно, так как массовые операции
+    не отправляют сигналы. Возвращает True, если ингредиенты изменились.
+    """
+    current = {
+        recipe_ingredient.ingredient_id: recipe_ingredient
+        for recipe_ingredient in recipe.recipes.all()
+    }
+    amounts = {
+        ingredient_data["id"]: ingredient_data["amount"]
+        for ingredient_data in ingredients_data
+    }
+    removed_ids = [
+        current[ingredient_id].id
+        for ingredient_id in current.keys() - amounts.keys()
+    ]
+    added = [
+        RecipeIngredient(
+            recipe=recipe, ingredient_id=ingredient_id, amount=amount
         )
-        recipe_ingredients.append(recipe_ingredient)
+        for ingredient_id, amount in amounts.items()
+        if ingredient_id not in current
+    ]
+    changed = []
+    for ingredient_id, recipe_ingredient in current.items():
+        amount = amounts.get(ingredient_id)
+        if amount is not None and amount != recipe_ingredient.amount:
+            recipe_ingredient.amount = amount
+            changed.append(recipe_ingredient)
+
+    if not (removed_ids or added or changed):
+        return False
+
+    apply_shopping_list_delta(-1, [recipe.id])
+    if removed_ids:
+        placeholders = ", ".join(["%s"] * len(removed_ids))
+        with connection.cursor() as cursor:
+            cursor.execute(
+                f"DELETE FROM {RecipeIngredient._meta.db_table} "
+                f"WHERE id IN ({placeholders})",
+                removed_ids,
+            )
+    if added:
+        RecipeIngredient.objects.bulk_create(added)
+    if changed:
+        RecipeIngredient.objects.bulk_update(changed, ("amount",))
+    apply_shopping_list_delta(1, [recipe.id])
 
-    RecipeIngredient.objects.bulk_create(recipe_ingredients)
+    invalidate_recipe_fragments([recipe.id])
+    touch_tables("recipes")
+    return True
+
+
+@lru_cache(maxsize=None)
+def register_pdf_font():
+    """Регистрирует шрифт для PDF один раз за время жизни процесса."""
+    pdfmetrics.registerFont(TTFont(PDF_FONT_NAME, PDF_FONT_PATH))
 
 
 def generate_shopping_list_pdf(recipes_in_shopping_list):
-    """Генерирует PDF с списком покупок на основе списка рецептов."""
-    response = HttpResponse(content_type="application/pdf")
-    response[
-        "Content-Disposition"
-    ] = 'attachment; filename="shopping_list.pdf"'
+    """
+    Генерирует PDF с списком покупок на основе списка рецептов.
 
-    p = canvas.Canvas(response)
+    Список переносится на новые страницы по мере заполнения. Возвращает
+    буфер с документом, готовый к потоковой отдаче.
+    """
+    register_pdf_font()
 
-    pdfmetrics.registerFont(TTFont("Arial", "./recipes/fonts/arial.ttf"))
-    p.setFont("Arial", 15)
+    buffer = io.BytesIO()
+    p = canvas.Canvas(buffer, pagesize=A4)
+    p.setFont(PDF_FONT_NAME, PDF_FONT_SIZE)
 
-    p.drawString(100, 800, "Список покупок:")
+    p.drawString(PDF_MARGIN_LEFT, PDF_TOP, "Список покупок:")
 
-    y_position = 780
+    y_position = PDF_TOP - PDF_LINE_HEIGHT
 
     for recipe in recipes_in_shopping_list:
+        if y_position < PDF_MARGIN_BOTTOM:
+            p.showPage()
+            p.setFont(PDF_FONT_NAME, PDF_FONT_SIZE)
+            y_position = PDF_TOP
+
         name = recipe["ingredient__name"]
         total_amount = recipe["total_amount"]
         measurement_unit = recipe["ingredient__measurement_unit"]
 
         item_text = f"{name} ({measurement_unit}) - {total_amount}"
-        p.drawString(100, y_position, item_text)
+        p.drawString(PDF_MARGIN_LEFT, y_position, item_text)
 
-        y_position -= 20
+        y_position -= PDF_LINE_HEIGHT
 
     p.showPage()
     p.save()
 
-    return response
+    buffer.seek(0)
+    return buffer
+
+
+def render_shopping_list_pdf(recipes_in_shopping_list):
+    """Возвращает содержимое PDF со списком покупок."""
+    return generate_shopping_list_pdf(recipes_in_shopping_list).getvalue()
+
+
+def get_shopping_list_document(recipes_in_shopping_list, export_format):
+    """
+    Возвращает документ со списком покупок, используя кэш.
+
+    Ключ кэша - хэш строк списка и формата, поэтому одинаковые списки
+    разных пользователей генерируются один раз.
+    """
+    rows = [
+        (
+            recipe["ingredient__name"],
+            recipe["ingredient__measurement_unit"],
+            recipe["total_amount"],
+        )
+        for recipe in recipes_in_shopping_list
+    ]
+    key = hashlib.sha256(
+        json.dumps([export_format, rows], ensure_ascii=False).encode()
+    ).hexdigest()
+
+    document = shopping_list_cache.get(key)
+    if document is None:
+        recipes = [
+            {
+                "ingredient__name": name,
+                "ingredient__measurement_unit": measurement_unit,
+                "total_amount": total_amount,
+            }
+            for name, measurement_unit, total_amount in rows
+        ]
+        document = SHOPPING_LIST_RENDERERS[export_format](recipes)
+        shopping_list_cache.set(key, document)
+
+    return io.BytesIO(document)
+
+
+class Echo:
+    """Псевдобуфер, возвращающий записанную строку вместо ее хранения."""
+
+    def write(self, value):
+        """Возвращает переданную строку."""
+        return value
+
+
+def generate_shopping_list_txt(recipes_in_shopping_list):
+    """Построчно генерирует список покупок в текстовом формате."""
+    yield "Список покупок:\n"
+    for recipe in recipes_in_shopping_list:
+        yield (
+            f"{recipe['ingredient__name']} "
+            f"({recipe['ingredient__measurement_unit']}) - "
+            f"{recipe['total_amount']}\n"
+        )
+
+
+def generate_shopping_list_csv(recipes_in_shopping_list):
+    """Построчно генерирует список покупок в формате CSV."""
+    writer = csv.writer(Echo())
+    yield writer.writerow(("name", "measurement_unit", "amount"))
+    for recipe in recipes_in_shopping_list:
+        yield writer.writerow(
+            (
+                recipe["ingredient__name"],
+                recipe["ingredient__measurement_unit"],
+                recipe["total_amount"],
+            )
+        )
+
+
+def generate_shopping_list_json(recipes_in_shopping_list):
+    """Поэлементно генерирует список покупок в виде JSON-массива."""
+    separator = "["
+    for recipe in recipes_in_shopping_list:
+        yield separator + json.dumps(
+            {
+                "name": recipe["ingredient__name"],
+                "measurement_unit": recipe["ingredient__measurement_unit"],
+                "amount": recipe["total_amount"],
+            },
+            ensure_ascii=False,
+        )
+        separator = ","
+    yield "[]" if separator == "[" else "]"
+
+
+SHOPPING_LIST_GENERATORS = {
+    "txt": generate_shopping_list_txt,
+    "csv": generate_shopping_list_csv,
+    "json": generate_shopping_list_json,
+}
+
+SHOPPING_LIST_RENDERERS = {
+    "pdf": render_shopping_list_pdf,
+}
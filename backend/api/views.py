@@ -1,49 +1,178 @@
-from typing import Optional
-
-from django.db.models import Sum
+import hashlib
+from collections import defaultdict
+from datetime import datetime, timedelta, timezone
+from typing import Callable, Iterator, Optional
+
+from django.conf import settings
+from django.db import transaction
+from django.db.models import BooleanField, Prefetch, Value
 from django.db.models.query import QuerySet
-from django.http import HttpResponse
+from django.http import FileResponse, Http404, StreamingHttpResponse
+from django.http.response import HttpResponseBase
 from django.shortcuts import get_object_or_404
+from django.utils.cache import patch_cache_control, patch_vary_headers
+from django.views.decorators.http import condition
 
+import djoser.views
 from django_filters.rest_framework import DjangoFilterBackend
 from rest_framework import generics, status, viewsets
 from rest_framework.decorators import action
 from rest_framework.filters import BaseFilterBackend
 from rest_framework.pagination import BasePagination
-from rest_framework.permissions import AllowAny, IsAuthenticated
+from rest_framework.permissions import SAFE_METHODS, AllowAny, IsAuthenticated
+from rest_framework.renderers import JSONRenderer
 from rest_framework.response import Response
+from rest_framework.settings import api_settings
 from rest_framework.views import APIView
 
+from foodgram.db_router import reads_from_replica
 from recipes.models import (
     FavoriteRecipe,
     Ingredient,
     Recipe,
     RecipeIngredient,
     ShoppingList,
+    ShoppingListIngredient,
     Tag
 )
-from users.models import Subscribe, User
+from recipes.units import normalize_shopping_list
+from users.models import User
 
+from .cache import get_table_versions, tag_cache, touch_tables
 from .filters import IngredientFilter, RecipeFilter
+from .pagination import RecipePagination
 from .permissions import OwnerOnlyPermission
+from .renderers import (
+    CSVRenderer,
+    PDFRenderer,
+    PlainTextRenderer,
+    ShoppingListJSONRenderer
+)
 from .serializers import (
-    FavoriteSerializer,
     IngredientSerializer,
     RecipeCreateSerializer,
     RecipeGETSerializer,
-    ShoppingListSerializer,
-    SubscriptionCreateSerializer,
+    RecipeIdsSerializer,
+    RecipeReadSerializer,
     SubscriptionSerializer,
     TagSerializer,
     UserGETSerializer
 )
 from .utils import (
+    SHOPPING_LIST_GENERATORS,
     add_favorite_or_shopping_list,
-    generate_shopping_list_pdf,
+    bulk_favorite_or_shopping_list,
+    delete_subscription,
+    get_shopping_list_document,
+    get_subscriptions,
+    insert_subscription,
     remove_favorite_or_shopping_list
 )
 
 
+class SubscriptionsContextMixin:
+    """
+    Примесь для представлений, сериализующих авторов.
+
+    Один раз за запрос загружает id авторов, на которых подписан текущий
+    пользователь, и передает их в контекст сериализатора.
+    """
+
+    def get_serializer_context(self) -> dict:
+        """Добавляет подписки пользователя в контекст сериализатора."""
+        context: dict = super().get_serializer_context()
+        context["subscriptions"] = get_subscriptions(self.request.user)
+        return context
+
+
+class ConditionalGetMixin:
+    """
+    Примесь для поддержки условных GET-запросов.
+
+    ETag и Last-Modified вычисляются по версиям таблиц, от которых зависит
+    ответ, поэтому при совпадении If-None-Match ответ 304 отдается без
+    обращения к данным и сериализации. Для авторизованных пользователей
+    учитываются также таблицы с пользовательскими флагами и id пользователя.
+    """
+
+    condition_tables: tuple[str, ...] = ()
+    user_condition_tables: tuple[str, ...] = ()
+
+    def get_condition(self, request) -> tuple[str, datetime]:
+        """Вычисляет ETag и время последнего изменения ответа."""
+        tables: tuple[str, ...] = self.condition_tables
+        user_id: Optional[int] = None
+        if self.user_condition_tables and request.user.is_authenticated:
+            tables += self.user_condition_tables
+            user_id = request.user.id
+
+        versions: dict[str, int] = get_table_versions(tables)
+        etag: str = hashlib.sha1(
+            repr(
+                (
+                    sorted(versions.items()),
+                    user_id,
+                    request.get_full_path(),
+                    request.META.get("HTTP_ACCEPT"),
+                )
+            ).encode()
+        ).hexdigest()
+        last_modified: datetime = datetime.fromtimestamp(
+            max(versions.values()) / 10**9, tz=timezone.utc
+        )
+        return etag, last_modified
+
+    def replica_may_lag(self, last_modified: datetime) -> bool:
+        """
+        Проверяет, может ли реплика запроса отставать от последних изменений.
+
+        Изменения считаются дошедшими до реплик через REPLICA_PIN_SECONDS.
+        """
+        return reads_from_replica() and datetime.now(
+            tz=timezone.utc
+        ) - last_modified < timedelta(seconds=settings.REPLICA_PIN_SECONDS)
+
+    def conditional(self, handler: Callable, request, *args, **kwargs):
+        """
+        Выполняет обработчик с проверкой условных заголовков.
+
+        Ответ разрешено хранить только с обязательной проверкой актуальности,
+        а ответы с пользовательскими флагами - только в кэше браузера
+        и отдельно для каждого токена. Ответ из возможно отстающей реплики
+        отдается без ETag и запрещается к хранению: иначе устаревшие данные
+        закэшировались бы под новой версией.
+        """
+        etag, last_modified = self.get_condition(request)
+        if self.replica_may_lag(last_modified):
+            response: HttpResponseBase = handler(request, *args, **kwargs)
+            patch_cache_control(response, no_store=True)
+            return response
+
+        response = condition(
+            etag_func=lambda *args, **kwargs: etag,
+            last_modified_func=lambda *args, **kwargs: last_modified,
+        )(handler)(request, *args, **kwargs)
+
+        if self.user_condition_tables:
+            patch_cache_control(response, private=True, no_cache=True)
+            patch_vary_headers(response, ("Authorization",))
+        else:
+            patch_cache_control(response, no_cache=True)
+        return response
+
+    def list(self, request, *args, **kwargs):
+        """Список объектов с поддержкой условных запросов."""
+        return self.conditional(super().list, request, *args, **kwargs)
+
+    def retrieve(self, request, *args, **kwargs):
+        """Объект с поддержкой условных запросов."""
+        return self.conditional(super().retrieve, request, *args, **kwargs)
+
+
+class UserViewSet(SubscriptionsContextMixin, djoser.views.UserViewSet):
+    """Представление для пользователей с пакетной загрузкой подписок."""
+
+
 class MeView(APIView):
     """Представление для получения данных о текущем пользователе."""
 
@@ -60,40 +189,57 @@ class SubscribeView(APIView):
 
     permission_classes: tuple[type[IsAuthenticated]] = (IsAuthenticated,)
 
-    def get_user_author(self, request, pk: int) -> tuple[User, User]:
-        """Получение текущего пользователя и автора по идентификатору."""
+    @transaction.atomic
+    def post(self, request, pk: int = None) -> Response:
+        """
+        Обработка HTTP-запроса POST для создания подписки на автора.
+
+        Подписка, обновление счетчика подписчиков и загрузка карточки
+        автора выполняются одним запросом, рецепты автора - вторым.
+        """
         user: User = request.user
-        author: User = get_object_or_404(User, id=pk)
-        return user, author
+        if user.id == pk:
+            return Response(
+                {
+                    api_settings.NON_FIELD_ERRORS_KEY: [
+                        "Нельзя подписываться на самого себя"
+                    ]
+                },
+                status=status.HTTP_400_BAD_REQUEST,
+            )
 
-    def post(self, request, pk: int = None) -> Response:
-        """Обработка HTTP-запроса POST для создания подписки на автора."""
-        user, author = self.get_user_author(
-            request, pk
-        )  # type: tuple[User, User]
-
-        serializer: type[
-            SubscriptionCreateSerializer
-        ] = SubscriptionCreateSerializer(
-            data={"user": user.id, "author": author.id},
-            context={"request": request},
+        author: Optional[User] = insert_subscription(user, pk)
+        if author is None:
+            get_object_or_404(User, id=pk)
+            return Response(
+                {api_settings.NON_FIELD_ERRORS_KEY: ["Вы уже подписаны"]},
+                status=status.HTTP_400_BAD_REQUEST,
+            )
+        touch_tables("subscriptions")
+
+        recipes_limit: Optional[str] = request.query_params.get(
+            "recipes_limit"
+        )
+        author.is_subscribed = True
+        author.preview_recipes = Recipe.objects.latest_by_author(
+            [author.id],
+            int(recipes_limit) if recipes_limit is not None else None,
+        )
+        serializer: SubscriptionSerializer = SubscriptionSerializer(
+            author, context={"request": request}
         )
-        serializer.is_valid(raise_exception=True)
-        serializer.save()
         return Response(serializer.data, status=status.HTTP_201_CREATED)
 
+    @transaction.atomic
     def delete(self, request, pk: int = None) -> Response:
         """Обработка HTTP-запроса DELETE для удаления подписки на автора."""
-        user, author = self.get_user_author(
-            request, pk
-        )  # type: tuple[User, User]
-
-        if subscribe := Subscribe.objects.filter(
-            user=user, author=author
-        ).first():
-            subscribe.delete()
+        user: User = request.user
+
+        if delete_subscription(user, pk):
+            touch_tables("subscriptions")
             return Response(status=status.HTTP_204_NO_CONTENT)
 
+        get_object_or_404(User, id=pk)
         return Response(
             {"ошибка": "вы не подписаны на этого автора."},
             status=status.HTTP_400_BAD_REQUEST,
@@ -109,21 +255,63 @@ class SubscriptionsListView(generics.ListAPIView):
     def get_queryset(self) -> QuerySet[User]:
         """Получение списка подписок пользователя."""
         user: User = self.request.user
-        return User.objects.filter(following__user=user)
+        return User.objects.filter(following__user=user).annotate(
+            is_subscribed=Value(True, output_field=BooleanField())
+        )
+
+    def paginate_queryset(
+        self, queryset: QuerySet[User]
+    ) -> Optional[list[User]]:
+        """Разбивает авторов на страницы и загружает их рецепты."""
+        authors: Optional[list[User]] = super().paginate_queryset(queryset)
+        if authors is None:
+            return None
+
+        recipes_limit: Optional[str] = self.request.query_params.get(
+            "recipes_limit"
+        )
+        recipes_by_author: dict[int, list[Recipe]] = defaultdict(list)
+        for recipe in Recipe.objects.latest_by_author(
+            [author.id for author in authors],
+            int(recipes_limit) if recipes_limit is not None else None,
+        ):
+            recipes_by_author[recipe.author_id].append(recipe)
+
+        for author in authors:
+            author.preview_recipes = recipes_by_author[author.id]
+        return authors
 
 
-class TagViewSet(viewsets.ReadOnlyModelViewSet):
+class TagViewSet(ConditionalGetMixin, viewsets.ReadOnlyModelViewSet):
     """Представление для просмотра тегов."""
 
-    queryset: QuerySet[Tag] = Tag.objects.all()
+    condition_tables: tuple[str, ...] = ("tags",)
+
     serializer_class: type[TagSerializer] = TagSerializer
     permission_classes: tuple[type[AllowAny]] = (AllowAny,)
     pagination_class: type[BasePagination] = None
 
+    def get_queryset(self) -> list[Tag]:
+        """Получает список тэгов из кэша."""
+        return tag_cache.all()
 
-class IngredientViewSet(viewsets.ReadOnlyModelViewSet):
+    def get_object(self) -> Tag:
+        """Получает тэг из кэша по идентификатору."""
+        try:
+            tag: Optional[Tag] = tag_cache.get(int(self.kwargs["pk"]))
+        except ValueError:
+            tag = None
+        if tag is None:
+            raise Http404
+        self.check_object_permissions(self.request, tag)
+        return tag
+
+
+class IngredientViewSet(ConditionalGetMixin, viewsets.ReadOnlyModelViewSet):
     """Представление для просмотра ингредиентов."""
 
+    condition_tables: tuple[str, ...] = ("ingredients",)
+
     queryset: QuerySet[Ingredient] = Ingredient.objects.all()
     serializer_class: type[IngredientSerializer] = IngredientSerializer
     permission_classes: tuple[type[AllowAny]] = (AllowAny,)
@@ -132,21 +320,64 @@ class IngredientViewSet(viewsets.ReadOnlyModelViewSet):
     pagination_class: type[BasePagination] = None
 
 
-class RecipeViewSet(viewsets.ModelViewSet):
+class RecipeViewSet(
+    ConditionalGetMixin, SubscriptionsContextMixin, viewsets.ModelViewSet
+):
     """Представление для просмотра и редактирования рецептов."""
 
+    condition_tables: tuple[str, ...] = (
+        "recipes",
+        "tags",
+        "ingredients",
+        "users",
+    )
+    user_condition_tables: tuple[str, ...] = (
+        "favorites",
+        "shopping_lists",
+        "subscriptions",
+    )
+
     permission_classes: tuple[type[OwnerOnlyPermission]] = (
         OwnerOnlyPermission,
     )
     filter_backends: tuple[type[BaseFilterBackend]] = (DjangoFilterBackend,)
     filterset_class: type[RecipeFilter] = RecipeFilter
+    pagination_class: type[BasePagination] = RecipePagination
+
+    def finalize_response(
+        self, request, response: HttpResponseBase, *args, **kwargs
+    ) -> HttpResponseBase:
+        """
+        Отдает ошибки выгрузки списка покупок в формате JSON.
+
+        Иначе тело ошибки 401 или 404 получило бы тип запрошенного
+        документа, например application/pdf.
+        """
+        if (
+            getattr(self, "action", None) == "download_shopping_cart"
+            and isinstance(response, Response)
+            and response.exception
+        ):
+            request.accepted_renderer = JSONRenderer()
+            request.accepted_media_type = JSONRenderer.media_type
+        return super().finalize_response(request, response, *args, **kwargs)
 
     def get_queryset(self) -> QuerySet[Recipe]:
         """Получает набор запросов для модели Recipe."""
         user_id: Optional[int] = self.request.user.id
-        queryset: QuerySet[Recipe] = Recipe.objects.select_related(
-            "author"
-        ).prefetch_related("tags", "ingredients")
+        queryset: QuerySet[Recipe] = Recipe.objects.select_related("author")
+        # При чтении тэги и ингредиенты нужны только для недостающих
+        # фрагментов кэша, и сериализатор загружает их сам.
+        if self.request.method not in SAFE_METHODS:
+            queryset = queryset.prefetch_related(
+                "tags",
+                Prefetch(
+                    "recipes",
+                    queryset=RecipeIngredient.objects.select_related(
+                        "ingredient"
+                    ),
+                ),
+            )
 
         if user_id is not None:
             queryset: QuerySet[Recipe] = queryset.favorited(
@@ -172,7 +403,7 @@ class RecipeViewSet(viewsets.ModelViewSet):
 
         if request.method == "POST":
             return add_favorite_or_shopping_list(
-                request, user, FavoriteRecipe, FavoriteSerializer, pk
+                request, user, FavoriteRecipe, RecipeReadSerializer, pk
             )
 
         elif request.method == "DELETE":
@@ -189,36 +420,88 @@ class RecipeViewSet(viewsets.ModelViewSet):
 
         if request.method == "POST":
             return add_favorite_or_shopping_list(
-                request, user, ShoppingList, ShoppingListSerializer, pk
+                request, user, ShoppingList, RecipeReadSerializer, pk
             )
 
         elif request.method == "DELETE":
             return remove_favorite_or_shopping_list(user, ShoppingList, pk)
 
+    @action(
+        detail=False,
+        methods=("post", "delete"),
+        permission_classes=(IsAuthenticated,),
+        url_path="favorite",
+    )
+    def bulk_favorite(self, request) -> Response:
+        """Массовое добавление или удаление рецептов из избранного."""
+        user: User = request.user
+        return bulk_favorite_or_shopping_list(
+            request, user, FavoriteRecipe, RecipeIdsSerializer
+        )
+
+    @action(
+        detail=False,
+        methods=("post", "delete"),
+        permission_classes=(IsAuthenticated,),
+        url_path="shopping_cart",
+    )
+    def bulk_shopping_cart(self, request) -> Response:
+        """Массовое добавление или удаление рецептов из списка покупок."""
+        user: User = request.user
+        return bulk_favorite_or_shopping_list(
+            request, user, ShoppingList, RecipeIdsSerializer
+        )
+
     @action(
         detail=False,
         methods=("get",),
         permission_classes=(IsAuthenticated,),
+        renderer_classes=(
+            PDFRenderer,
+            PlainTextRenderer,
+            CSVRenderer,
+            ShoppingListJSONRenderer,
+        ),
     )
-    def download_shopping_cart(self, request) -> HttpResponse:
-        """Загрузка списка покупок ингредиентов в виде текстового файла."""
+    def download_shopping_cart(self, request) -> HttpResponseBase:
+        """
+        Загрузка списка покупок ингредиентов.
+
+        Формат (pdf, txt, csv или json) выбирается параметром format или
+        заголовком Accept, по умолчанию - PDF. Количества ингредиентов с
+        совместимыми единицами измерения (г и кг, мл и л) суммируются.
+        Текстовые форматы отдаются потоком по мере чтения строк из базы.
+        """
         user: User = request.user
-        recipes_in_shopping_list: QuerySet[RecipeIngredient] = (
-            RecipeIngredient.objects.filter(
-                recipe__in_shopping_lists__user=user
+        recipes_in_shopping_list: QuerySet[ShoppingListIngredient] = (
+            ShoppingListIngredient.objects.filter(user=user)
+            .values(
+                "ingredient__name",
+                "ingredient__measurement_unit",
+                "total_amount",
             )
-            .values("ingredient__name", "ingredient__measurement_unit")
-            .annotate(total_amount=Sum("amount"))
+            .order_by("ingredient__name", "ingredient__measurement_unit")
         )
+        export_format: str = request.accepted_renderer.format
+        filename: str = f"shopping_list.{export_format}"
 
-        pdf_buffer: HttpResponse = generate_shopping_list_pdf(
-            recipes_in_shopping_list
+        shopping_list: Iterator[dict] = normalize_shopping_list(
+            recipes_in_shopping_list.iterator()
         )
 
-        response: HttpResponse = HttpResponse(
-            pdf_buffer.getvalue(), content_type="application/pdf"
+        if export_format == PDFRenderer.format:
+            return FileResponse(
+                get_shopping_list_document(shopping_list, export_format),
+                as_attachment=True,
+                filename=filename,
+                content_type=PDFRenderer.media_type,
+            )
+
+        response: StreamingHttpResponse = StreamingHttpResponse(
+            SHOPPING_LIST_GENERATORS[export_format](shopping_list),
+            content_type=(
+                f"{request.accepted_renderer.media_type}; charset=utf-8"
+            ),
         )
-        response[
-            "Content-Disposition"
-        ] = 'attachment; filename="shopping_list.pdf"'
+        response["Content-Disposition"] = f'attachment; filename="{filename}"'
         return response
@@ -1,7 +1,12 @@
 REGEX = r"^[\w.@+-]+$"
 MAX_CHAR_LENGTH = 200
 MAX_COLOR_LENGTH = 7
+MAX_IMAGE_STATUS_LENGTH = 16
+FINGERPRINT_LENGTH = 64
 MIN_AMOUNT = 1
 MIN_COOKING_TIME = 1
 MAX_EMAIL_LENGTH = 254
 MAX_USERNAME_LENGTH = 150
+MAX_INGREDIENT_SEARCH_RESULTS = 20
+MAX_BULK_RECIPES = 100
+SEARCH_CONFIG = "russian"
@@ -0,0 +1,129 @@
+import hashlib
+import random
+from contextlib import contextmanager
+from contextvars import ContextVar
+
+from django.conf import settings
+from django.core.cache import caches
+
+PRIMARY_DATABASE = "default"
+
+read_database = ContextVar("read_database", default=PRIMARY_DATABASE)
+
+
+def replica_pin_key(request):
+    """
+    Возвращает ключ кэша, закрепляющего чтение клиента за основной БД.
+
+    Клиент определяется по заголовку Authorization, поэтому закрепление
+    работает и для клиентов API без cookie. В ключ попадает только хэш
+    заголовка, а не сам токен.
+    """
+    authorization = request.META.get("HTTP_AUTHORIZATION")
+    if not authorization:
+        return None
+    digest = hashlib.sha256(authorization.encode()).hexdigest()
+    return f"replica-pin:{digest}"
+
+
+def reads_from_replica():
+    """Проверяет, читает ли текущий запрос данные из реплики."""
+    return read_database.get() != PRIMARY_DATABASE
+
+
+@contextmanager
+def use_primary_database():
+    """
+    Направляет чтение внутри блока в основную БД.
+
+    Используется при заполнении общих кэшей: данные, прочитанные из
+    отстающей реплики, попали бы в кэш под уже новой версией таблицы.
+    """
+    token = read_database.set(PRIMARY_DATABASE)
+    try:
+        yield
+    finally:
+        read_database.reset(token)
+
+
+class PrimaryReplicaRouter:
+    """
+    Маршрутизатор запросов между основной БД и репликами.
+
+    Запись всегда идет в основную БД, а чтение - в базу, выбранную для
+    текущего запроса. Вне HTTP-запросов (команды, фоновые потоки) чтение
+    идет в основную БД: реплика выбирается только в ReplicaPinMiddleware.
+    """
+
+    def db_for_read(self, model, **hints):
+        """Возвращает базу для чтения, выбранную для запроса."""
+        return read_database.get()
+
+    def db_for_write(self, model, **hints):
+        """Возвращает основную БД для записи."""
+        return PRIMARY_DATABASE
+
+    def allow_relation(self, obj1, obj2, **hints):
+        """Разрешает связи между объектами: все базы содержат одни данные."""
+        return True
+
+    def allow_migrate(self, db, app_label, model_name=None, **hints):
+        """Разрешает миграции только в основной БД."""
+        return db == PRIMARY_DATABASE
+
+
+class ReplicaPinMiddleware:
+    """
+    Промежуточный слой выбора базы для чтения на время запроса.
+
+    Безопасные запросы читают из случайной реплики. Изменяющий запрос
+    целиком выполняется на основной БД и еще REPLICA_PIN_SECONDS держит
+    чтение клиента на основной БД, чтобы он не увидел устаревшие
+    избранное, корзину или рецепты. Закрепление хранится в кэше рецептов
+    по заголовку Authorization, а для запросов без него - в cookie.
+    """
+
+    def __init__(self, get_response):
+        self.get_response = get_response
+
+    def __call__(self, request):
+        is_write = request.method not in ("GET", "HEAD", "OPTIONS")
+        pin_key = replica_pin_key(request)
+        if (
+            settings.DATABASE_REPLICAS
+            and not is_write
+            and not self.is_pinned(request, pin_key)
+        ):
+            database = random.choice(settings.DATABASE_REPLICAS)
+        else:
+            database = PRIMARY_DATABASE
+        token = read_database.set(database)
+        try:
+            response = self.get_response(request)
+        finally:
+            read_database.reset(token)
+        if settings.DATABASE_REPLICAS and is_write:
+            self.pin(response, pin_key)
+        return response
+
+    def is_pinned(self, request, pin_key):
+        """Проверяет, закреплено ли чтение клиента за основной БД."""
+        if settings.REPLICA_PIN_COOKIE in request.COOKIES:
+            return True
+        return pin_key is not None and bool(
+            caches[settings.RECIPES_CACHE_ALIAS].get(pin_key)
+        )
+
+    def pin(self, response, pin_key):
+        """Закрепляет чтение клиента за основной БД."""
+        if pin_key is not None:
+            caches[settings.RECIPES_CACHE_ALIAS].set(
+                pin_key, 1, timeout=settings.REPLICA_PIN_SECONDS
+            )
+        response.set_cookie(
+            settings.REPLICA_PIN_COOKIE,
+            "1",
+            max_age=settings.REPLICA_PIN_SECONDS,
+            httponly=True,
+            samesite="Lax",
+        )
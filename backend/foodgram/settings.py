@@ -1,4 +1,5 @@
 import os
+import sys
 from pathlib import Path
 
 from dotenv import load_dotenv
@@ -24,6 +25,7 @@ INSTALLED_APPS = [
     "django.contrib.sessions",
     "django.contrib.messages",
     "django.contrib.staticfiles",
+    "django.contrib.postgres",
     "rest_framework",
     "rest_framework.authtoken",
     "django_filters",
@@ -32,6 +34,7 @@ INSTALLED_APPS = [
 
 MIDDLEWARE = [
     "django.middleware.security.SecurityMiddleware",
+    "foodgram.db_router.ReplicaPinMiddleware",
     "django.contrib.sessions.middleware.SessionMiddleware",
     "django.middleware.common.CommonMiddleware",
     "django.middleware.csrf.CsrfViewMiddleware",
@@ -72,6 +75,26 @@ DATABASES = {
     }
 }
 
+DATABASE_REPLICAS = []
+
+for number, address in enumerate(
+    filter(None, os.getenv("DB_REPLICA_HOSTS", "").split(",")), start=1
+):
+    host, _, port = address.partition(":")
+    alias = f"replica_{number}"
+    DATABASES[alias] = {
+        **DATABASES["default"],
+        "HOST": host,
+        "PORT": port or DATABASES["default"]["PORT"],
+        "TEST": {"MIRROR": "default"},
+    }
+    DATABASE_REPLICAS.append(alias)
+
+DATABASE_ROUTERS = ["foodgram.db_router.PrimaryReplicaRouter"]
+
+REPLICA_PIN_COOKIE = "pin_primary"
+REPLICA_PIN_SECONDS = int(os.getenv("REPLICA_PIN_SECONDS", 10))
+
 
 PASSWORD_VALIDATION_USER = (
     "django.contrib.auth.password_validation.UserAttributeSimilarityValidator"
@@ -124,6 +147,42 @@ MEDIA_ROOT = os.path.join(BASE_DIR, "media")
 
 DEFAULT_AUTO_FIELD = "django.db.models.BigAutoField"
 
+TESTING = sys.argv[1:2] == ["test"]
+
+RECIPES_CACHE_ALIAS = "recipes"
+
+if TESTING:
+    RECIPES_CACHE = {
+        "BACKEND": "django.core.cache.backends.locmem.LocMemCache",
+        "LOCATION": "recipes",
+    }
+else:
+    RECIPES_CACHE = {
+        "BACKEND": os.getenv(
+            "RECIPES_CACHE_BACKEND",
+            "django.core.cache.backends.memcached.PyMemcacheCache",
+        ),
+        "LOCATION": os.getenv("RECIPES_CACHE_LOCATION", "memcached:11211"),
+    }
+RECIPES_CACHE["TIMEOUT"] = int(os.getenv("RECIPES_CACHE_TIMEOUT", 60 * 60))
+if ".memcached." not in RECIPES_CACHE["BACKEND"]:
+    RECIPES_CACHE["OPTIONS"] = {
+        "MAX_ENTRIES": int(os.getenv("RECIPES_CACHE_MAX_ENTRIES", 100000)),
+    }
+
+CACHES = {
+    "default": {
+        "BACKEND": "django.core.cache.backends.locmem.LocMemCache",
+    },
+    RECIPES_CACHE_ALIAS: RECIPES_CACHE,
+}
+
+IMAGE_PROCESSING_WORKERS = int(os.getenv("IMAGE_PROCESSING_WORKERS", 2))
+
+SHOPPING_LIST_CACHE_SIZE = int(
+    os.getenv("SHOPPING_LIST_CACHE_SIZE", 32 * 1024 * 1024)
+)
+
 REST_FRAMEWORK = {
     "DEFAULT_PERMISSION_CLASSES": [
         "rest_framework.permissions.IsAuthenticatedOrReadOnly",
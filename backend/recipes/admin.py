@@ -8,6 +8,7 @@ from .models import (
     ShoppingList,
     Tag
 )
+from .shopping_lists import apply_shopping_list_delta
 
 
 class RecipeIngredientInline(admin.TabularInline):
@@ -22,16 +23,18 @@ class RecipeAdmin(admin.ModelAdmin):
     """Административная панель для управления рецептами."""
 
     inlines = (RecipeIngredientInline,)
-    list_display = ("name", "author", "favorites_count")
+    list_display = ("name", "author", "favorites_count", "image_status")
     list_filter = ("author", "name", "tags")
     filter_horizontal = ("tags",)
     search_fields = ("name", "author")
 
-    def favorites_count(self, obj):
-        """Метод для отображения числа добавлений в избранное."""
-        return obj.favorited_by.count()
-
-    favorites_count.short_description = "Число добавлений в избранное"
+    def save_related(self, request, form, formsets, change):
+        """Сохраняет связанные объекты и обновляет списки покупок."""
+        if change:
+            apply_shopping_list_delta(-1, [form.instance.id])
+        super().save_related(request, form, formsets, change)
+        if change:
+            apply_shopping_list_delta(1, [form.instance.id])
 
 
 @admin.register(Ingredient)
@@ -0,0 +1,41 @@
+from django.db.models import Count, F, OuterRef, Subquery
+from django.db.models.functions import Coalesce, Greatest
+
+from users.models import Subscribe, User
+
+from .models import FavoriteRecipe, Recipe
+
+
+def shift_counter(queryset, field, delta):
+    """Изменяет счетчик field у объектов queryset на delta, не ниже нуля."""
+    return queryset.update(**{field: Greatest(F(field) + delta, 0)})
+
+
+def count_subquery(model, field):
+    """Возвращает подзапрос числа объектов model, ссылающихся через field."""
+    return Coalesce(
+        Subquery(
+            model.objects.filter(**{field: OuterRef("pk")})
+            .order_by()
+            .values(field)
+            .annotate(count=Count("pk"))
+            .values("count")
+        ),
+        0,
+    )
+
+
+def recount_counters():
+    """
+    Пересчитывает все денормализованные счетчики.
+
+    Возвращает количество обновленных рецептов и пользователей.
+    """
+    recipes = Recipe.objects.update(
+        favorites_count=count_subquery(FavoriteRecipe, "recipe")
+    )
+    users = User.objects.update(
+        recipes_count=count_subquery(Recipe, "author"),
+        followers_count=count_subquery(Subscribe, "author"),
+    )
+    return recipes, users
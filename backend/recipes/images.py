@@ -0,0 +1,219 @@
+import io
+import logging
+from concurrent.futures import ThreadPoolExecutor
+from functools import lru_cache
+
+from django.conf import settings
+from django.core.files.base import ContentFile
+from django.db import connection
+from django.templatetags.static import static
+
+from PIL import Image, ImageOps
+
+from .models import ImageStatus, Recipe
+
+logger = logging.getLogger(__name__)
+
+DERIVATIVES_DIR = "recipes/derivatives"
+PLACEHOLDER_IMAGE = "recipes/images/placeholder.svg"
+
+# Ошибки Pillow при открытии поврежденных или слишком больших изображений.
+IMAGE_ERRORS = (OSError, ValueError, SyntaxError, Image.DecompressionBombError)
+
+# Размер производного изображения: максимальные (ширина, высота).
+IMAGE_SIZES = {
+    "preview": (320, 320),
+    "card": (640, 640),
+    "full": (1600, 1600),
+}
+
+# Формат производного изображения: (расширение, параметры сохранения).
+IMAGE_FORMATS = {
+    "jpeg": ("jpg", {"quality": 85, "optimize": True, "progressive": True}),
+    "webp": ("webp", {"quality": 80, "method": 4}),
+}
+
+
+@lru_cache(maxsize=None)
+def get_supported_formats():
+    """
+    Возвращает форматы производных изображений, доступные в Pillow.
+
+    Pillow может быть собран без поддержки WebP, тогда создаются только
+    копии в JPEG.
+    """
+    Image.init()
+    return tuple(
+        image_format
+        for image_format in IMAGE_FORMATS
+        if image_format.upper() in Image.SAVE
+    )
+
+
+def derivative_name(name, size, image_format):
+    """
+    Возвращает имя файла производного изображения для оригинала name.
+
+    Копии лежат в каталоге, названном полным именем оригинала в хранилище
+    вместе с расширением. Хранилище не выдает одно имя двум файлам, поэтому
+    копии разных загрузок (например, temp.png и temp.jpg от
+    Base64ImageField) не пересекаются.
+    """
+    extension, _ = IMAGE_FORMATS[image_format]
+    return f"{DERIVATIVES_DIR}/{name}/{size}.{extension}"
+
+
+def get_placeholder_url():
+    """Возвращает адрес изображения-заглушки."""
+    return static(PLACEHOLDER_IMAGE)
+
+
+def get_image_urls(recipe, size):
+    """
+    Возвращает адреса изображения рецепта размера size по форматам.
+
+    Пока изображение не обработано, для всех форматов возвращается адрес
+    заглушки.
+    """
+    if not recipe.image:
+        return dict.fromkeys(IMAGE_FORMATS)
+
+    if recipe.image_status != ImageStatus.READY:
+        return dict.fromkeys(IMAGE_FORMATS, get_placeholder_url())
+
+    storage = recipe.image.storage
+    urls = {
+        image_format: storage.url(
+            derivative_name(recipe.image.name, size, image_format)
+        )
+        for image_format in get_supported_formats()
+    }
+    return {
+        image_format: urls.get(image_format, urls["jpeg"])
+        for image_format in IMAGE_FORMATS
+    }
+
+
+def derivatives_exist(recipe):
+    """Проверяет, созданы ли производные изображения текущего оригинала."""
+    return (
+        recipe.image_status == ImageStatus.READY
+        and recipe.image.storage.exists(
+            derivative_name(recipe.image.name, "full", "jpeg")
+        )
+    )
+
+
+def generate_image_derivatives(recipe):
+    """
+    Проверяет изображение рецепта и создает его производные изображения.
+
+    Изображения уменьшаются с сохранением пропорций и не увеличиваются.
+    Для форматов, не поддерживаемых Pillow, копии не создаются, и вместо
+    них отдается JPEG. После сохранения файлов рецепт получает статус
+    ready.
+    """
+    storage = recipe.image.storage
+    with recipe.image.open("rb") as file:
+        data = file.read()
+    with Image.open(io.BytesIO(data)) as image:
+        image.verify()
+    with Image.open(io.BytesIO(data)) as image:
+        original = ImageOps.exif_transpose(image).convert("RGB")
+
+    for size, dimensions in IMAGE_SIZES.items():
+        resized = original.copy()
+        resized.thumbnail(dimensions, Image.LANCZOS)
+
+        for image_format in get_supported_formats():
+            _, options = IMAGE_FORMATS[image_format]
+            buffer = io.BytesIO()
+            resized.save(buffer, image_format.upper(), **options)
+            # Копии зависят только от оригинала, поэтому перезапись не
+            # затрагивает рецепты с другими изображениями.
+            name = derivative_name(recipe.image.name, size, image_format)
+            if storage.exists(name):
+                storage.delete(name)
+            storage.save(name, ContentFile(buffer.getvalue()))
+
+    recipe.image_status = ImageStatus.READY
+    recipe.save(update_fields=("image_status",))
+
+
+def process_recipe_image(recipe_id):
+    """
+    Обрабатывает изображение рецепта recipe_id.
+
+    Если изображение не удалось открыть или проверить, рецепт получает
+    статус failed и продолжает отдавать заглушку.
+    """
+    recipe = (
+        Recipe.objects.filter(pk=recipe_id)
+        .only("id", "image", "image_status")
+        .first()
+    )
+    if recipe is None or not recipe.image:
+        return
+
+    try:
+        generate_image_derivatives(recipe)
+    except IMAGE_ERRORS:
+        logger.exception(
+            "Не удалось обработать изображение рецепта %s", recipe_id
+        )
+        recipe.image_status = ImageStatus.FAILED
+        recipe.save(update_fields=("image_status",))
+
+
+def delete_image_derivatives(name):
+    """
+    Удаляет производные изображения оригинала name.
+
+    Копии остаются, пока оригинал name указан хотя бы у одного рецепта:
+    импорт может назначить одно изображение нескольким рецептам.
+    """
+    if Recipe.objects.filter(image=name).exists():
+        return
+    storage = Recipe._meta.get_field("image").storage
+    for size in IMAGE_SIZES:
+        for image_format in IMAGE_FORMATS:
+            storage.delete(derivative_name(name, size, image_format))
+
+
+def run_in_pool(function, *args):
+    """Выполняет функцию в потоке пула и закрывает его соединение."""
+    try:
+        function(*args)
+    finally:
+        connection.close()
+
+
+@lru_cache(maxsize=None)
+def get_image_pool():
+    """Возвращает пул потоков для обработки изображений."""
+    return ThreadPoolExecutor(
+        max_workers=settings.IMAGE_PROCESSING_WORKERS,
+        thread_name_prefix="recipe-images",
+    )
+
+
+def schedule_in_image_pool(function, *args):
+    """
+    Ставит работу с изображениями в очередь пула.
+
+    При IMAGE_PROCESSING_WORKERS = 0 работа выполняется сразу.
+    """
+    if settings.IMAGE_PROCESSING_WORKERS:
+        get_image_pool().submit(run_in_pool, function, *args)
+    else:
+        function(*args)
+
+
+def schedule_image_processing(recipe_id):
+    """Ставит обработку изображения рецепта в очередь пула."""
+    schedule_in_image_pool(process_recipe_image, recipe_id)
+
+
+def schedule_derivatives_deletion(name):
+    """Ставит удаление производных изображений оригинала name в очередь."""
+    schedule_in_image_pool(delete_image_derivatives, name)
@@ -0,0 +1,190 @@
+import statistics
+import time
+import tracemalloc
+import uuid
+
+from django.core.management.base import BaseCommand
+from django.db import transaction
+
+from rest_framework.test import APIRequestFactory, force_authenticate
+
+from api.cache import shopping_list_cache
+from api.views import RecipeViewSet
+from recipes.models import (
+    Ingredient,
+    Recipe,
+    RecipeIngredient,
+    ShoppingList,
+    ShoppingListIngredient
+)
+from recipes.shopping_lists import apply_shopping_list_delta
+from recipes.units import normalize_shopping_list
+from users.models import User
+
+BENCHMARK_UNITS = ("г", "кг", "мл", "л", "шт", "по вкусу")
+BENCHMARK_FORMATS = ("pdf", "txt", "csv", "json")
+
+
+class Command(BaseCommand):
+    """Команда для замера выгрузки списка покупок."""
+
+    help = (
+        "Замер времени и пикового потребления памяти при выгрузке списка "
+        "покупок из N позиций и отдельно - при приведении единиц "
+        "измерения (этап units). Данные создаются во временной транзакции "
+        "и откатываются после замера."
+    )
+
+    def add_arguments(self, parser):
+        """Добавляет аргументы команды."""
+        parser.add_argument(
+            "--sizes",
+            type=int,
+            nargs="+",
+            default=[1000, 5000, 20000],
+            help="Размеры списка покупок (по умолчанию: 1000 5000 20000)",
+        )
+        parser.add_argument(
+            "--formats",
+            nargs="+",
+            choices=BENCHMARK_FORMATS,
+            default=list(BENCHMARK_FORMATS),
+            help="Форматы выгрузки",
+        )
+        parser.add_argument(
+            "--repeat",
+            type=int,
+            default=5,
+            help="Число повторов каждого замера (по умолчанию: 5)",
+        )
+
+    def create_shopping_list(self, size):
+        """
+        Создает пользователя с рецептом из size ингредиентов в корзине.
+
+        Ингредиенты попарно совпадают по названию и различаются единицами
+        (г и кг, мл и л), чтобы в замер попадало приведение единиц.
+        """
+        prefix = uuid.uuid4().hex
+        user = User.objects.create_user(
+            email=f"{prefix}@benchmark.local",
+            username=prefix,
+            first_name="benchmark",
+            last_name="benchmark",
+        )
+        Ingredient.objects.bulk_create(
+            Ingredient(
+                name=f"{prefix} {number // 2}",
+                measurement_unit=BENCHMARK_UNITS[
+                    number % len(BENCHMARK_UNITS)
+                ],
+            )
+            for number in range(size)
+        )
+        recipe = Recipe.objects.create(
+            author=user,
+            name=prefix,
+            text=prefix,
+            image="recipes/images/benchmark.jpg",
+            cooking_time=1,
+        )
+        RecipeIngredient.objects.bulk_create(
+            RecipeIngredient(
+                recipe=recipe, ingredient_id=ingredient_id, amount=number + 1
+            )
+            for number, ingredient_id in enumerate(
+                Ingredient.objects.filter(
+                    name__startswith=prefix
+                ).values_list("id", flat=True)
+            )
+        )
+        ShoppingList.objects.bulk_create(
+            [ShoppingList(user=user, recipe=recipe)]
+        )
+        apply_shopping_list_delta(1, [recipe.id], user.id)
+        return user
+
+    def download(self, view, user, export_format):
+        """Выгружает список покупок и возвращает размер ответа в байтах."""
+        request = APIRequestFactory().get(
+            "/api/recipes/download_shopping_cart/",
+            {"format": export_format},
+        )
+        force_authenticate(request, user)
+        response = view(request)
+        return sum(len(chunk) for chunk in response)
+
+    def normalize(self, rows):
+        """Приводит единицы строк списка и возвращает число позиций."""
+        return sum(1 for _ in normalize_shopping_list(rows))
+
+    def measure(self, function, *args, repeat):
+        """
+        Возвращает медиану времени, пиковую память и результат функции.
+
+        Перед каждым повтором очищается кэш документов, чтобы замер
+        выгрузки включал генерацию документа.
+        """
+        timings = []
+        peaks = []
+        for _ in range(repeat):
+            shopping_list_cache.clear()
+            tracemalloc.start()
+            started = time.perf_counter()
+            result = function(*args)
+            timings.append(time.perf_counter() - started)
+            peaks.append(tracemalloc.get_traced_memory()[1])
+            tracemalloc.stop()
+        return statistics.median(timings), max(peaks), result
+
+    def write_row(self, stage, size, elapsed, peak, result):
+        """Выводит строку таблицы результатов."""
+        self.stdout.write(
+            f"{stage:>6} {size:>8} {elapsed * 1000:>12.1f} "
+            f"{peak / 1024:>16.1f} {result:>12}"
+        )
+
+    def handle(self, *args, **options):
+        """Обработчик команды для замера выгрузки."""
+        view = RecipeViewSet.as_view(
+            {"get": "download_shopping_cart"},
+            **RecipeViewSet.download_shopping_cart.kwargs,
+        )
+        self.stdout.write(
+            f"{'этап':>6} {'позиций':>8} {'медиана, мс':>12} "
+            f"{'пик памяти, КиБ':>16} {'результат':>12}"
+        )
+        for size in options["sizes"]:
+            with transaction.atomic():
+                user = self.create_shopping_list(size)
+                rows = list(
+                    ShoppingListIngredient.objects.filter(user=user)
+                    .values(
+                        "ingredient__name",
+                        "ingredient__measurement_unit",
+                        "total_amount",
+                    )
+                    .order_by(
+                        "ingredient__name", "ingredient__measurement_unit"
+                    )
+                )
+                self.write_row(
+                    "units",
+                    size,
+                    *self.measure(
+                        self.normalize, rows, repeat=options["repeat"]
+                    ),
+                )
+                for export_format in options["formats"]:
+                    self.write_row(
+                        export_format,
+                        size,
+                        *self.measure(
+                            self.download,
+                            view,
+                            user,
+                            export_format,
+                            repeat=options["repeat"],
+                        ),
+                    )
+                transaction.set_rollback(True)
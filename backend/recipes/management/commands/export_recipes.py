@@ -0,0 +1,91 @@
+import json
+
+from django.core.management.base import BaseCommand
+from django.db.models import Prefetch
+
+from recipes.models import Recipe, RecipeIngredient
+
+DEFAULT_BATCH_SIZE = 500
+
+
+class Command(BaseCommand):
+    """Команда для выгрузки рецептов в формате JSON Lines."""
+
+    help = (
+        "Выгрузка рецептов с тэгами, ингредиентами и ссылками на "
+        "изображения в JSONL-файл (один рецепт на строку)"
+    )
+
+    def add_arguments(self, parser):
+        """Добавляет аргументы команды."""
+        parser.add_argument("path", help="Путь к JSONL-файлу")
+        parser.add_argument(
+            "--batch-size",
+            type=int,
+            default=DEFAULT_BATCH_SIZE,
+            help="Количество рецептов, загружаемых из базы за раз",
+        )
+
+    def read_batches(self, batch_size):
+        """
+        Читает рецепты пачками по возрастанию id.
+
+        Каждая пачка загружается вместе с тэгами и ингредиентами, поэтому
+        в памяти одновременно находится не более batch_size рецептов.
+        """
+        queryset = (
+            Recipe.objects.select_related("author")
+            .prefetch_related(
+                "tags",
+                Prefetch(
+                    "recipes",
+                    queryset=RecipeIngredient.objects.select_related(
+                        "ingredient"
+                    ),
+                ),
+            )
+            .order_by("id")
+        )
+        last_id = 0
+        while batch := list(queryset.filter(id__gt=last_id)[:batch_size]):
+            yield batch
+            last_id = batch[-1].id
+
+    def serialize(self, recipe):
+        """Возвращает запись рецепта для JSONL-файла."""
+        return {
+            "id": recipe.id,
+            "author": recipe.author.email,
+            "name": recipe.name,
+            "text": recipe.text,
+            "cooking_time": recipe.cooking_time,
+            "image": recipe.image.name,
+            "image_status": recipe.image_status,
+            "tags": [tag.slug for tag in recipe.tags.all()],
+            "ingredients": [
+                {
+                    "name": recipe_ingredient.ingredient.name,
+                    "measurement_unit": (
+                        recipe_ingredient.ingredient.measurement_unit
+                    ),
+                    "amount": recipe_ingredient.amount,
+                }
+                for recipe_ingredient in recipe.recipes.all()
+            ],
+        }
+
+    def handle(self, *args, **options):
+        """Обработчик команды для выгрузки рецептов."""
+        exported = 0
+        with open(options["path"], "w", encoding="utf8") as file:
+            for batch in self.read_batches(options["batch_size"]):
+                file.writelines(
+                    json.dumps(self.serialize(recipe), ensure_ascii=False)
+                    + "\n"
+                    for recipe in batch
+                )
+                exported += len(batch)
+
+        self.stdout.write(
+            self.style.SUCCESS(f"Выгружено рецептов: {exported}.")
+        )
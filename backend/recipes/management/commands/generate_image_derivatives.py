@@ -0,0 +1,48 @@
+from django.core.management.base import BaseCommand
+
+from recipes.images import IMAGE_ERRORS, generate_image_derivatives
+from recipes.models import ImageStatus, Recipe
+
+
+class Command(BaseCommand):
+    """Команда для создания производных изображений рецептов."""
+
+    help = (
+        "Создание уменьшенных копий изображений рецептов в форматах "
+        "JPEG и WebP"
+    )
+
+    def add_arguments(self, parser):
+        """Добавляет аргументы команды."""
+        parser.add_argument(
+            "--force",
+            action="store_true",
+            help="Пересоздать копии для всех рецептов",
+        )
+
+    def handle(self, *args, **options):
+        """Обработчик команды для создания производных изображений."""
+        recipes = Recipe.objects.exclude(image="").only(
+            "id", "image", "image_status"
+        )
+        if not options["force"]:
+            recipes = recipes.exclude(image_status=ImageStatus.READY)
+
+        created = failed = 0
+        for recipe in recipes.iterator():
+            try:
+                generate_image_derivatives(recipe)
+            except IMAGE_ERRORS as error:
+                failed += 1
+                recipe.image_status = ImageStatus.FAILED
+                recipe.save(update_fields=("image_status",))
+                self.stderr.write(f"Рецепт {recipe.pk}: {error}")
+            else:
+                created += 1
+
+        self.stdout.write(
+            self.style.SUCCESS(
+                f"Копии изображений созданы для {created} рецептов, "
+                f"ошибок: {failed}."
+            )
+        )
@@ -0,0 +1,235 @@
+import hashlib
+import json
+from collections import Counter
+from itertools import islice
+
+from django.core.management.base import BaseCommand, CommandError
+from django.db import connection, transaction
+
+from api.cache import touch_tables
+from recipes.counters import shift_counter
+from recipes.models import (
+    ImageStatus,
+    Ingredient,
+    Recipe,
+    RecipeImport,
+    RecipeIngredient,
+    Tag
+)
+from users.models import User
+
+DEFAULT_BATCH_SIZE = 500
+FINGERPRINT_CHUNK_SIZE = 1024 * 1024
+
+
+class Command(BaseCommand):
+    """Команда для загрузки рецептов из файла JSON Lines."""
+
+    help = (
+        "Загрузка рецептов из JSONL-файла, созданного export_recipes. "
+        "Файлы изображений должны быть скопированы в MEDIA_ROOT отдельно. "
+        "Прерванная загрузка того же файла продолжается с места сбоя"
+    )
+
+    def add_arguments(self, parser):
+        """Добавляет аргументы команды."""
+        parser.add_argument("path", help="Путь к JSONL-файлу")
+        parser.add_argument(
+            "--batch-size",
+            type=int,
+            default=DEFAULT_BATCH_SIZE,
+            help="Количество рецептов в одной транзакции",
+        )
+        parser.add_argument(
+            "--restart",
+            action="store_true",
+            help=(
+                "Загрузить файл с начала, даже если он уже загружался или "
+                "изменился после прерванной загрузки"
+            ),
+        )
+
+    def get_fingerprint(self, path):
+        """Возвращает SHA-256 содержимого файла."""
+        digest = hashlib.sha256()
+        with open(path, "rb") as file:
+            while chunk := file.read(FINGERPRINT_CHUNK_SIZE):
+                digest.update(chunk)
+        return digest.hexdigest()
+
+    def load_maps(self):
+        """Загружает словари тэгов, ингредиентов и авторов."""
+        self.tags = dict(Tag.objects.values_list("slug", "id"))
+        self.ingredients = {
+            (name, measurement_unit): ingredient_id
+            for ingredient_id, name, measurement_unit in (
+                Ingredient.objects.values_list(
+                    "id", "name", "measurement_unit"
+                )
+            )
+        }
+        self.authors = dict(User.objects.values_list("email", "id"))
+
+    def resolve(self, mapping, key, number, description):
+        """Возвращает id объекта по ключу или прерывает загрузку."""
+        try:
+            return mapping[key]
+        except KeyError:
+            raise CommandError(
+                f"Строка {number}: {description} {key} не найден"
+            )
+
+    def build(self, number, line):
+        """Возвращает рецепт, id его тэгов и ингредиенты из строки файла."""
+        try:
+            record = json.loads(line)
+            recipe = Recipe(
+                author_id=self.resolve(
+                    self.authors, record["author"], number, "автор"
+                ),
+                name=record["name"],
+                text=record["text"],
+                cooking_time=record["cooking_time"],
+                image=record["image"],
+                image_status=ImageStatus.PENDING,
+            )
+            tag_ids = [
+                self.resolve(self.tags, slug, number, "тэг")
+                for slug in record["tags"]
+            ]
+            ingredients = [
+                (
+                    self.resolve(
+                        self.ingredients,
+                        (item["name"], item["measurement_unit"]),
+                        number,
+                        "ингредиент",
+                    ),
+                    item["amount"],
+                )
+                for item in record["ingredients"]
+            ]
+        except (KeyError, TypeError, ValueError) as error:
+            raise CommandError(f"Строка {number}: некорректная запись {error}")
+        return record.get("id"), recipe, tag_ids, ingredients
+
+    @transaction.atomic
+    def import_batch(self, progress, records, lines_count):
+        """
+        Загружает пачку рецептов в одной транзакции.
+
+        В той же транзакции сохраняется число загруженных строк файла,
+        поэтому после сбоя пачка не загружается повторно. Массовая вставка
+        рецептов не отправляет сигналы, поэтому счетчики рецептов авторов
+        обновляются здесь. СУБД, не возвращающие id из bulk_create,
+        сохраняют рецепты по одному с обычными сигналами.
+        """
+        recipes = [recipe for _, recipe, _, _ in records]
+        if connection.features.can_return_rows_from_bulk_insert:
+            Recipe.objects.bulk_create(recipes)
+            for author_id, count in Counter(
+                recipe.author_id for recipe in recipes
+            ).items():
+                shift_counter(
+                    User.objects.filter(pk=author_id), "recipes_count", count
+                )
+        else:
+            for recipe in recipes:
+                recipe.save()
+
+        Recipe.tags.through.objects.bulk_create(
+            Recipe.tags.through(recipe_id=recipe.id, tag_id=tag_id)
+            for _, recipe, tag_ids, _ in records
+            for tag_id in tag_ids
+        )
+        RecipeIngredient.objects.bulk_create(
+            RecipeIngredient(
+                recipe_id=recipe.id, ingredient_id=ingredient_id, amount=amount
+            )
+            for _, recipe, _, ingredients in records
+            for ingredient_id, amount in ingredients
+        )
+
+        progress.lines_count = lines_count
+        progress.last_source_id = records[-1][0]
+        progress.save(update_fields=("lines_count", "last_source_id"))
+        touch_tables("recipes")
+
+    def get_progress(self, path, fingerprint, restart):
+        """
+        Возвращает ход загрузки файла или None, если файл уже загружен.
+
+        Прерванную загрузку нельзя продолжить, если файл с тем же путем
+        изменился: строки нового файла не соответствуют загруженным.
+        """
+        interrupted = RecipeImport.objects.filter(
+            path=path, completed=False
+        ).exclude(fingerprint=fingerprint)
+        if restart:
+            interrupted.delete()
+        elif interrupted.exists():
+            raise CommandError(
+                "Файл изменился после прерванной загрузки, продолжить ее "
+                "нельзя. Чтобы загрузить файл с начала, укажите --restart."
+            )
+
+        progress, _ = RecipeImport.objects.get_or_create(
+            fingerprint=fingerprint, defaults={"path": path}
+        )
+        if restart:
+            progress.lines_count = 0
+            progress.last_source_id = None
+            progress.completed = False
+        elif progress.completed:
+            self.stdout.write(
+                "Файл уже загружен. Для повторной загрузки укажите --restart."
+            )
+            return None
+        elif progress.lines_count:
+            self.stdout.write(
+                f"Продолжение загрузки со строки {progress.lines_count + 1} "
+                f"после рецепта с id {progress.last_source_id} в файле."
+            )
+        progress.path = path
+        progress.save()
+        return progress
+
+    def handle(self, *args, **options):
+        """Обработчик команды для загрузки рецептов."""
+        path = options["path"]
+        batch_size = options["batch_size"]
+        if batch_size < 1:
+            raise CommandError("Размер пачки должен быть положительным")
+        try:
+            fingerprint = self.get_fingerprint(path)
+        except OSError as error:
+            raise CommandError(f"Ошибка чтения файла: {error}")
+
+        progress = self.get_progress(path, fingerprint, options["restart"])
+        if progress is None:
+            return
+        self.load_maps()
+
+        imported = 0
+        done = progress.lines_count
+        with open(path, encoding="utf8") as file:
+            lines = enumerate(islice(file, done, None), done + 1)
+            while batch := list(islice(lines, batch_size)):
+                records = [
+                    self.build(number, line)
+                    for number, line in batch
+                    if line.strip()
+                ]
+                if records:
+                    self.import_batch(progress, records, batch[-1][0])
+                imported += len(records)
+
+        progress.completed = True
+        progress.save(update_fields=("completed",))
+        self.stdout.write(
+            self.style.SUCCESS(
+                f"Загружено рецептов: {imported}. "
+                "Изображения рецептов получили статус pending: после "
+                "копирования файлов выполните generate_image_derivatives."
+            )
+        )
@@ -1,46 +1,195 @@
 import csv
+import io
+import json
+import time
+from itertools import islice
+from pathlib import Path
 
-from django.core.management.base import BaseCommand
+from django.conf import settings
+from django.core.management.base import BaseCommand, CommandError
+from django.db import connection, transaction
 
-from recipes.models import Ingredient
+from api.cache import touch_tables
+from foodgram.constants import MAX_CHAR_LENGTH
+from recipes.models import Ingredient, RecipeIngredient, ShoppingListIngredient
+
+DEFAULT_DATA_PATH = settings.BASE_DIR / "data" / "ingredients.csv"
+DEFAULT_BATCH_SIZE = 1000
+STAGING_TABLE = "ingredient_staging"
 
 
 class Command(BaseCommand):
-    """Команда для загрузки данных из CSV-файлов."""
+    """Команда для загрузки ингредиентов из CSV- или JSON-файлов."""
 
-    help = "Загрузка данных из CSV-файлов"
+    help = (
+        "Загрузка ингредиентов из CSV-, JSON- или JSON Lines-файла. "
+        "Существующие пары (название, единица измерения) пропускаются"
+    )
 
     def add_arguments(self, parser):
-        parser.add_argument("csv_path", type=str, help="Путь к CSV-файлу")
-
-    def bulk_create_ingredients(self, model, rows):
-        """Массовое создание ингредиентов на основе данных из строк CSV."""
-        ingredients = []
-        for row in rows:
-            name, measurement_unit = row[0], row[1]
-            existing_ingredient = model.objects.filter(name=name).exists()
-            if not existing_ingredient:
-                ingredients.append(
-                    model(name=name, measurement_unit=measurement_unit)
+        """Добавляет аргументы команды."""
+        parser.add_argument(
+            "path",
+            nargs="?",
+            default=str(DEFAULT_DATA_PATH),
+            help="Путь к файлу (.csv, .json или .jsonl)",
+        )
+        parser.add_argument(
+            "--batch-size",
+            type=int,
+            default=DEFAULT_BATCH_SIZE,
+            help="Количество строк в одной пачке",
+        )
+        parser.add_argument(
+            "--dry-run",
+            action="store_true",
+            help="Выполнить импорт и откатить изменения",
+        )
+        parser.add_argument(
+            "--truncate",
+            action="store_true",
+            help=(
+                "Удалить все ингредиенты перед импортом (только если они "
+                "не используются в рецептах и списках покупок)"
+            ),
+        )
+
+    def read_rows(self, path):
+        """Построчно читает пары (название, единица измерения) из файла."""
+        suffix = Path(path).suffix.lower()
+        with open(path, encoding="utf8") as file:
+            if suffix == ".json":
+                records = (
+                    (item["name"], item["measurement_unit"])
+                    for item in json.load(file)
+                )
+            elif suffix == ".jsonl":
+                records = (
+                    (item["name"], item["measurement_unit"])
+                    for item in map(json.loads, filter(str.strip, file))
+                )
+            else:
+                records = (row[:2] for row in csv.reader(file) if row)
+
+            for number, (name, measurement_unit) in enumerate(records, 1):
+                name, measurement_unit = name.strip(), measurement_unit.strip()
+                if not name or not measurement_unit:
+                    raise CommandError(f"Строка {number}: пустое значение")
+                if max(len(name), len(measurement_unit)) > MAX_CHAR_LENGTH:
+                    raise CommandError(
+                        f"Строка {number}: значение длиннее "
+                        f"{MAX_CHAR_LENGTH} символов"
+                    )
+                yield name, measurement_unit
+
+    def read_batches(self, path, batch_size):
+        """Читает строки файла пачками по batch_size."""
+        rows = self.read_rows(path)
+        while batch := list(islice(rows, batch_size)):
+            yield batch
+
+    def copy_ingredients(self, batches):
+        """
+        Загружает ингредиенты в PostgreSQL через COPY.
+
+        Пачки копируются во временную таблицу, откуда новые ингредиенты
+        добавляются одним INSERT ... ON CONFLICT DO NOTHING. Возвращает
+        количество прочитанных и добавленных строк.
+        """
+        table = Ingredient._meta.db_table
+        rows_count = 0
+        with connection.cursor() as cursor:
+            cursor.execute(
+                f"CREATE TEMP TABLE {STAGING_TABLE} "
+                "(name text, measurement_unit text) ON COMMIT DROP"
+            )
+            for batch in batches:
+                buffer = io.StringIO()
+                csv.writer(buffer).writerows(batch)
+                buffer.seek(0)
+                cursor.copy_expert(
+                    f"COPY {STAGING_TABLE} (name, measurement_unit) "
+                    "FROM STDIN WITH (FORMAT csv)",
+                    buffer,
                 )
+                rows_count += len(batch)
+
+            cursor.execute(
+                f"INSERT INTO {table} (name, measurement_unit) "
+                f"SELECT DISTINCT name, measurement_unit FROM {STAGING_TABLE} "
+                "ON CONFLICT (name, measurement_unit) DO NOTHING"
+            )
+            return rows_count, cursor.rowcount
 
-        model.objects.bulk_create(ingredients)
-        return len(ingredients)
+    def bulk_create_ingredients(self, batches):
+        """
+        Загружает ингредиенты через bulk_create для СУБД без COPY.
+
+        Возвращает количество прочитанных и добавленных строк.
+        """
+        initial_count = Ingredient.objects.count()
+        rows_count = 0
+        for batch in batches:
+            Ingredient.objects.bulk_create(
+                (
+                    Ingredient(name=name, measurement_unit=measurement_unit)
+                    for name, measurement_unit in batch
+                ),
+                batch_size=len(batch),
+                ignore_conflicts=True,
+            )
+            rows_count += len(batch)
+        return rows_count, Ingredient.objects.count() - initial_count
+
+    def truncate_ingredients(self):
+        """
+        Удаляет все ингредиенты.
+
+        Удаление каскадно стерло бы ингредиенты рецептов и списки покупок,
+        поэтому при наличии ссылок на ингредиенты команда прерывается.
+        """
+        if (
+            RecipeIngredient.objects.exists()
+            or ShoppingListIngredient.objects.exists()
+        ):
+            raise CommandError(
+                "Ингредиенты используются в рецептах или списках покупок, "
+                "--truncate удалил бы их. Загрузите данные без --truncate."
+            )
+        Ingredient.objects.all().delete()
 
     def handle(self, *args, **options):
         """Обработчик команды для выполнения загрузки данных."""
-        csv_path = options["csv_path"]
+        if options["batch_size"] < 1:
+            raise CommandError("Размер пачки должен быть положительным")
 
-        with open(csv_path, encoding="utf8") as csvfile:
-            reader = csv.reader(csvfile)
-            rows = list(reader)
+        started = time.perf_counter()
+        batches = self.read_batches(options["path"], options["batch_size"])
+        try:
+            with transaction.atomic():
+                if options["truncate"]:
+                    self.truncate_ingredients()
+                if connection.vendor == "postgresql":
+                    rows_count, added_count = self.copy_ingredients(batches)
+                else:
+                    rows_count, added_count = self.bulk_create_ingredients(
+                        batches
+                    )
+                if options["dry_run"]:
+                    transaction.set_rollback(True)
+        except (OSError, KeyError, ValueError) as error:
+            raise CommandError(f"Ошибка чтения файла: {error}")
+        elapsed = time.perf_counter() - started
 
-            rows_count = len(rows)
-            bulk_count = self.bulk_create_ingredients(Ingredient, rows)
+        if not options["dry_run"] and (added_count or options["truncate"]):
+            touch_tables("ingredients")
 
+        prefix = "Пробный запуск: " if options["dry_run"] else ""
         self.stdout.write(
             self.style.SUCCESS(
-                f"Импорт данных завершился успешно! "
-                f"Всего {bulk_count} записей было добавлено из {rows_count}."
+                f"{prefix}Импорт данных завершился успешно! "
+                f"Всего {added_count} записей было добавлено из "
+                f"{rows_count}. Скорость: "
+                f"{rows_count / elapsed if elapsed else 0:.0f} строк/с."
             )
         )
@@ -0,0 +1,21 @@
+from django.core.management.base import BaseCommand
+from django.db import transaction
+
+from recipes.shopping_lists import rebuild_shopping_list_ingredients
+
+
+class Command(BaseCommand):
+    """Команда для пересчета суммарных ингредиентов списков покупок."""
+
+    help = "Пересчет суммарных ингредиентов списков покупок"
+
+    def handle(self, *args, **options):
+        """Обработчик команды для выполнения пересчета."""
+        with transaction.atomic():
+            rows_count = rebuild_shopping_list_ingredients()
+
+        self.stdout.write(
+            self.style.SUCCESS(
+                f"Списки покупок пересчитаны! Всего {rows_count} записей."
+            )
+        )
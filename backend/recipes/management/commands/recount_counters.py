@@ -0,0 +1,25 @@
+from django.core.management.base import BaseCommand
+from django.db import transaction
+
+from recipes.counters import recount_counters
+
+
+class Command(BaseCommand):
+    """Команда для пересчета денормализованных счетчиков."""
+
+    help = (
+        "Пересчет числа добавлений рецептов в избранное, "
+        "числа рецептов и подписчиков пользователей"
+    )
+
+    def handle(self, *args, **options):
+        """Обработчик команды для выполнения пересчета счетчиков."""
+        with transaction.atomic():
+            recipes_count, users_count = recount_counters()
+
+        self.stdout.write(
+            self.style.SUCCESS(
+                f"Счетчики пересчитаны для {recipes_count} рецептов "
+                f"и {users_count} пользователей."
+            )
+        )
@@ -0,0 +1,67 @@
+# Generated by Django 3.2.3 on 2026-10-18 19:53
+
+import django.contrib.postgres.search
+from django.contrib.postgres.operations import TrigramExtension
+from django.db import migrations
+
+SEARCH_VECTOR_SQL = (
+    "setweight(to_tsvector('russian', coalesce({row}.name, '')), 'A') || "
+    "setweight(to_tsvector('russian', coalesce({row}.text, '')), 'B')"
+)
+
+CREATE_SEARCH_SQL = [
+    "CREATE INDEX recipes_ingredient_name_trgm "
+    "ON recipes_ingredient USING gin (name gin_trgm_ops)",
+    "CREATE INDEX recipes_recipe_name_trgm "
+    "ON recipes_recipe USING gin (name gin_trgm_ops)",
+    "CREATE INDEX recipes_recipe_search_vector "
+    "ON recipes_recipe USING gin (search_vector)",
+    "CREATE FUNCTION recipes_recipe_search_vector_update() "
+    "RETURNS trigger AS $$ BEGIN "
+    f"NEW.search_vector := {SEARCH_VECTOR_SQL.format(row='NEW')}; "
+    "RETURN NEW; END $$ LANGUAGE plpgsql",
+    "CREATE TRIGGER recipes_recipe_search_vector_trigger "
+    "BEFORE INSERT OR UPDATE OF name, text ON recipes_recipe "
+    "FOR EACH ROW EXECUTE PROCEDURE recipes_recipe_search_vector_update()",
+    "UPDATE recipes_recipe SET search_vector = "
+    f"{SEARCH_VECTOR_SQL.format(row='recipes_recipe')}",
+]
+
+DROP_SEARCH_SQL = [
+    "DROP TRIGGER IF EXISTS recipes_recipe_search_vector_trigger "
+    "ON recipes_recipe",
+    "DROP FUNCTION IF EXISTS recipes_recipe_search_vector_update()",
+    "DROP INDEX IF EXISTS recipes_recipe_search_vector",
+    "DROP INDEX IF EXISTS recipes_recipe_name_trgm",
+    "DROP INDEX IF EXISTS recipes_ingredient_name_trgm",
+]
+
+
+def run_postgresql(statements):
+    """Возвращает функцию, выполняющую SQL только в PostgreSQL."""
+    def run(apps, schema_editor):
+        if schema_editor.connection.vendor != "postgresql":
+            return
+        for statement in statements:
+            schema_editor.execute(statement)
+    return run
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('recipes', '0001_initial'),
+    ]
+
+    operations = [
+        TrigramExtension(),
+        migrations.AddField(
+            model_name='recipe',
+            name='search_vector',
+            field=django.contrib.postgres.search.SearchVectorField(editable=False, null=True, verbose_name='Поисковый вектор'),
+        ),
+        migrations.RunPython(
+            run_postgresql(CREATE_SEARCH_SQL),
+            run_postgresql(DROP_SEARCH_SQL),
+        ),
+    ]
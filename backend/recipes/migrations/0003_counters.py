@@ -0,0 +1,50 @@
+# Generated by Django 3.2.3 on 2026-10-18 19:55
+
+from django.db import migrations, models
+from django.db.models import Count, OuterRef, Subquery
+from django.db.models.functions import Coalesce
+
+
+def count_subquery(model, field):
+    return Coalesce(
+        Subquery(
+            model.objects.filter(**{field: OuterRef("pk")})
+            .order_by()
+            .values(field)
+            .annotate(count=Count("pk"))
+            .values("count")
+        ),
+        0,
+    )
+
+
+def fill_counters(apps, schema_editor):
+    Recipe = apps.get_model("recipes", "Recipe")
+    FavoriteRecipe = apps.get_model("recipes", "FavoriteRecipe")
+    User = apps.get_model("users", "User")
+    Subscribe = apps.get_model("users", "Subscribe")
+
+    Recipe.objects.update(
+        favorites_count=count_subquery(FavoriteRecipe, "recipe")
+    )
+    User.objects.update(
+        recipes_count=count_subquery(Recipe, "author"),
+        followers_count=count_subquery(Subscribe, "author"),
+    )
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('users', '0002_counters'),
+        ('recipes', '0002_search'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='recipe',
+            name='favorites_count',
+            field=models.PositiveIntegerField(default=0, editable=False, verbose_name='Число добавлений в избранное'),
+        ),
+        migrations.RunPython(fill_counters, migrations.RunPython.noop),
+    ]
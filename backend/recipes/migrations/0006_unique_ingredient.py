@@ -0,0 +1,61 @@
+# Generated by Django 3.2.3 on 2026-10-18 21:10
+
+from django.db import migrations, models
+from django.db.models import Count, F, Min
+
+
+def merge_duplicate_ingredients(apps, schema_editor):
+    Ingredient = apps.get_model("recipes", "Ingredient")
+    RecipeIngredient = apps.get_model("recipes", "RecipeIngredient")
+    ShoppingListIngredient = apps.get_model(
+        "recipes", "ShoppingListIngredient"
+    )
+
+    duplicates = (
+        Ingredient.objects.values("name", "measurement_unit")
+        .annotate(keep_id=Min("id"), count=Count("id"))
+        .filter(count__gt=1)
+    )
+    for duplicate in duplicates:
+        keep_id = duplicate["keep_id"]
+        other_ids = list(
+            Ingredient.objects.filter(
+                name=duplicate["name"],
+                measurement_unit=duplicate["measurement_unit"],
+            )
+            .exclude(id=keep_id)
+            .values_list("id", flat=True)
+        )
+        RecipeIngredient.objects.filter(ingredient_id__in=other_ids).update(
+            ingredient_id=keep_id
+        )
+        for row in ShoppingListIngredient.objects.filter(
+            ingredient_id__in=other_ids
+        ):
+            target, _ = ShoppingListIngredient.objects.get_or_create(
+                user_id=row.user_id,
+                ingredient_id=keep_id,
+                defaults={"total_amount": 0},
+            )
+            ShoppingListIngredient.objects.filter(pk=target.pk).update(
+                total_amount=F("total_amount") + row.total_amount
+            )
+            row.delete()
+        Ingredient.objects.filter(id__in=other_ids).delete()
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('recipes', '0005_image_status'),
+    ]
+
+    operations = [
+        migrations.RunPython(
+            merge_duplicate_ingredients, migrations.RunPython.noop
+        ),
+        migrations.AddConstraint(
+            model_name='ingredient',
+            constraint=models.UniqueConstraint(fields=('name', 'measurement_unit'), name='unique_ingredient_name_measurement_unit'),
+        ),
+    ]
@@ -0,0 +1,29 @@
+# Generated by Django 3.2.3 on 2026-10-18 21:40
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('recipes', '0006_unique_ingredient'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='RecipeImport',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('fingerprint', models.CharField(max_length=64, unique=True, verbose_name='SHA-256 файла')),
+                ('path', models.TextField(verbose_name='Путь к файлу')),
+                ('lines_count', models.PositiveIntegerField(default=0, verbose_name='Число загруженных строк')),
+                ('last_source_id', models.BigIntegerField(blank=True, null=True, verbose_name='id последнего загруженного рецепта в файле')),
+                ('completed', models.BooleanField(default=False, verbose_name='Загрузка завершена')),
+            ],
+            options={
+                'verbose_name': 'Загрузка рецептов',
+                'verbose_name_plural': 'Загрузки рецептов',
+                'ordering': ('id',),
+            },
+        ),
+    ]
@@ -1,8 +1,16 @@
+from django.contrib.postgres.search import SearchVectorField
 from django.core.validators import RegexValidator
 from django.db import models
-from django.db.models import Exists, OuterRef
-
-from foodgram.constants import MAX_CHAR_LENGTH, MAX_COLOR_LENGTH, REGEX
+from django.db.models import Exists, F, OuterRef, Window
+from django.db.models.functions import RowNumber
+
+from foodgram.constants import (
+    FINGERPRINT_LENGTH,
+    MAX_CHAR_LENGTH,
+    MAX_COLOR_LENGTH,
+    MAX_IMAGE_STATUS_LENGTH,
+    REGEX
+)
 from users.models import User
 
 
@@ -19,6 +27,43 @@ class RecipeQuerySet(models.QuerySet):
             )
         )
 
+    def latest_by_author(self, author_ids, limit=None):
+        """
+        Возвращает последние рецепты авторов одним запросом.
+
+        При заданном limit для каждого автора выбирается не более limit
+        рецептов с помощью ROW_NUMBER() OVER (PARTITION BY author_id).
+        """
+        if not author_ids:
+            return []
+
+        queryset = self.filter(author_id__in=author_ids).only(
+            "id",
+            "name",
+            "image",
+            "image_status",
+            "cooking_time",
+            "author_id",
+        )
+        if limit is None:
+            return list(queryset)
+
+        ranked = queryset.annotate(
+            row_number=Window(
+                expression=RowNumber(),
+                partition_by=[F("author_id")],
+                order_by=F("id").desc(),
+            )
+        )
+        sql, params = ranked.query.sql_with_params()
+        return list(
+            self.raw(
+                f"SELECT * FROM ({sql}) AS ranked "
+                "WHERE ranked.row_number <= %s ORDER BY ranked.id DESC",
+                (*params, limit),
+            )
+        )
+
     def in_shopping_cart(self, user_id):
         """Аннотирует queryset полем is_in_shopping_cart."""
         return self.annotate(
@@ -42,6 +87,12 @@ class Ingredient(models.Model):
         ordering = ("id",)
         verbose_name = "Ингредиент"
         verbose_name_plural = "Ингредиенты"
+        constraints = [
+            models.UniqueConstraint(
+                fields=["name", "measurement_unit"],
+                name="unique_ingredient_name_measurement_unit",
+            )
+        ]
 
     def __str__(self):
         """Возвращает строковое представление ингредиента."""
@@ -72,6 +123,14 @@ class Tag(models.Model):
         return self.name
 
 
+class ImageStatus(models.TextChoices):
+    """Статусы обработки изображения рецепта."""
+
+    PENDING = "pending", "Обрабатывается"
+    READY = "ready", "Готово"
+    FAILED = "failed", "Ошибка"
+
+
 class Recipe(models.Model):
     """Модель для представления рецептов."""
 
@@ -89,6 +148,19 @@ class Recipe(models.Model):
         on_delete=models.CASCADE,
         verbose_name="Автор",
     )
+    search_vector = SearchVectorField(
+        "Поисковый вектор", null=True, editable=False
+    )
+    favorites_count = models.PositiveIntegerField(
+        "Число добавлений в избранное", default=0, editable=False
+    )
+    image_status = models.CharField(
+        "Статус обработки изображения",
+        max_length=MAX_IMAGE_STATUS_LENGTH,
+        choices=ImageStatus.choices,
+        default=ImageStatus.PENDING,
+        editable=False,
+    )
     objects = RecipeQuerySet.as_manager()
 
     class Meta:
@@ -187,3 +259,72 @@ class ShoppingList(models.Model):
     def __str__(self):
         """Возвращает строковое представление списка покупок."""
         return self.recipe.name
+
+
+class ShoppingListIngredient(models.Model):
+    """
+    Модель для представления суммарных ингредиентов списка покупок.
+
+    Поддерживается в актуальном состоянии при изменении списка покупок и
+    рецептов в нем, поэтому выгрузка списка не требует агрегации.
+    """
+
+    user = models.ForeignKey(
+        User,
+        related_name="shopping_list_ingredients",
+        on_delete=models.CASCADE,
+        verbose_name="Пользователь",
+    )
+    ingredient = models.ForeignKey(
+        Ingredient,
+        related_name="in_shopping_lists",
+        on_delete=models.CASCADE,
+        verbose_name="Ингредиент",
+    )
+    total_amount = models.IntegerField("Общее количество", default=0)
+
+    class Meta:
+        ordering = ("id",)
+        verbose_name = "Ингредиент списка покупок"
+        verbose_name_plural = "Ингредиенты списков покупок"
+        constraints = [
+            models.UniqueConstraint(
+                fields=["user", "ingredient"],
+                name="unique_user_shopping_list_ingredient",
+            )
+        ]
+
+    def __str__(self):
+        """Возвращает строковое представление ингредиента списка покупок."""
+        return self.ingredient.name
+
+
+class RecipeImport(models.Model):
+    """
+    Модель для хранения хода загрузки файла рецептов.
+
+    Файл определяется по SHA-256 его содержимого. Число загруженных строк
+    сохраняется в той же транзакции, что и пачка рецептов, поэтому после
+    сбоя загрузка продолжается без повторной вставки рецептов.
+    """
+
+    fingerprint = models.CharField(
+        "SHA-256 файла", max_length=FINGERPRINT_LENGTH, unique=True
+    )
+    path = models.TextField("Путь к файлу")
+    lines_count = models.PositiveIntegerField(
+        "Число загруженных строк", default=0
+    )
+    last_source_id = models.BigIntegerField(
+        "id последнего загруженного рецепта в файле", null=True, blank=True
+    )
+    completed = models.BooleanField("Загрузка завершена", default=False)
+
+    class Meta:
+        ordering = ("id",)
+        verbose_name = "Загрузка рецептов"
+        verbose_name_plural = "Загрузки рецептов"
+
+    def __str__(self):
+        """Возвращает строковое представление загрузки рецептов."""
+        return self.path
@@ -0,0 +1,78 @@
+from django.db import connection
+
+from .models import RecipeIngredient, ShoppingList, ShoppingListIngredient
+
+
+def apply_shopping_list_delta(sign, recipe_ids, user_id=None):
+    """
+    Прибавляет к суммарным ингредиентам списков покупок ингредиенты рецептов.
+
+    Для sign=1 количества ингредиентов рецептов recipe_ids добавляются в
+    списки покупок всех пользователей, у которых эти рецепты в корзине, для
+    sign=-1 - вычитаются. С user_id изменяется только список этого
+    пользователя, а количества берутся из ингредиентов рецептов без
+    обращения к корзине: вызывающий код сам гарантирует, что рецепты только
+    что добавлены в корзину или удалены из нее. Изменение выполняется одним
+    запросом INSERT ... ON CONFLICT DO UPDATE, после чего удаляются
+    обнулившиеся строки затронутых ингредиентов (и пользователя).
+    """
+    recipe_ids = list(recipe_ids)
+    if not recipe_ids:
+        return
+
+    aggregate = ShoppingListIngredient._meta.db_table
+    shopping_list = ShoppingList._meta.db_table
+    recipe_ingredient = RecipeIngredient._meta.db_table
+    placeholders = ", ".join(["%s"] * len(recipe_ids))
+
+    if user_id is None:
+        source = (
+            "SELECT sl.user_id, ri.ingredient_id, %s * SUM(ri.amount) "
+            f"FROM {shopping_list} sl "
+            f"JOIN {recipe_ingredient} ri ON ri.recipe_id = sl.recipe_id "
+            f"WHERE sl.recipe_id IN ({placeholders}) "
+            "GROUP BY sl.user_id, ri.ingredient_id"
+        )
+        params = [sign, *recipe_ids]
+    else:
+        source = (
+            "SELECT %s, ri.ingredient_id, %s * SUM(ri.amount) "
+            f"FROM {recipe_ingredient} ri "
+            f"WHERE ri.recipe_id IN ({placeholders}) "
+            "GROUP BY ri.ingredient_id"
+        )
+        params = [user_id, sign, *recipe_ids]
+
+    with connection.cursor() as cursor:
+        cursor.execute(
+            f"INSERT INTO {aggregate} (user_id, ingredient_id, total_amount) "
+            f"{source} "
+            "ON CONFLICT (user_id, ingredient_id) DO UPDATE SET "
+            f"total_amount = {aggregate}.total_amount "
+            "+ excluded.total_amount",
+            params,
+        )
+
+    if sign < 0:
+        emptied = ShoppingListIngredient.objects.filter(
+            ingredient_id__in=RecipeIngredient.objects.filter(
+                recipe_id__in=recipe_ids
+            ).values("ingredient_id"),
+            total_amount__lte=0,
+        )
+        if user_id is not None:
+            emptied = emptied.filter(user_id=user_id)
+        emptied.delete()
+
+
+def rebuild_shopping_list_ingredients():
+    """
+    Полностью пересчитывает суммарные ингредиенты списков покупок.
+
+    Возвращает количество созданных строк.
+    """
+    ShoppingListIngredient.objects.all().delete()
+    apply_shopping_list_delta(
+        1, ShoppingList.objects.values_list("recipe_id", flat=True).distinct()
+    )
+    return ShoppingListIngredient.objects.count()
@@ -0,0 +1,135 @@
+from django.db import transaction
+from django.db.models.signals import (
+    post_delete,
+    post_init,
+    post_save,
+    pre_delete
+)
+from django.dispatch import receiver
+
+from users.models import Subscribe, User
+
+from .counters import shift_counter
+from .images import (
+    derivatives_exist,
+    schedule_derivatives_deletion,
+    schedule_image_processing
+)
+from .models import FavoriteRecipe, ImageStatus, Recipe, ShoppingList
+from .shopping_lists import apply_shopping_list_delta
+
+
+@receiver(post_save, sender=FavoriteRecipe)
+def increment_favorites_count(sender, instance, created, **kwargs):
+    """Увеличивает счетчик избранного рецепта."""
+    if created:
+        shift_counter(
+            Recipe.objects.filter(pk=instance.recipe_id), "favorites_count", 1
+        )
+
+
+@receiver(post_delete, sender=FavoriteRecipe)
+def decrement_favorites_count(sender, instance, **kwargs):
+    """Уменьшает счетчик избранного рецепта."""
+    shift_counter(
+        Recipe.objects.filter(pk=instance.recipe_id), "favorites_count", -1
+    )
+
+
+@receiver(post_save, sender=Recipe)
+def increment_recipes_count(sender, instance, created, **kwargs):
+    """Увеличивает счетчик рецептов автора."""
+    if created:
+        shift_counter(
+            User.objects.filter(pk=instance.author_id), "recipes_count", 1
+        )
+
+
+@receiver(post_delete, sender=Recipe)
+def decrement_recipes_count(sender, instance, **kwargs):
+    """Уменьшает счетчик рецептов автора."""
+    shift_counter(
+        User.objects.filter(pk=instance.author_id), "recipes_count", -1
+    )
+
+
+@receiver(post_save, sender=Subscribe)
+def increment_followers_count(sender, instance, created, **kwargs):
+    """Увеличивает счетчик подписчиков автора."""
+    if created:
+        shift_counter(
+            User.objects.filter(pk=instance.author_id), "followers_count", 1
+        )
+
+
+@receiver(post_delete, sender=Subscribe)
+def decrement_followers_count(sender, instance, **kwargs):
+    """Уменьшает счетчик подписчиков автора."""
+    shift_counter(
+        User.objects.filter(pk=instance.author_id), "followers_count", -1
+    )
+
+
+@receiver(post_save, sender=ShoppingList)
+def add_to_shopping_list_ingredients(sender, instance, created, **kwargs):
+    """Добавляет ингредиенты рецепта в суммарный список покупок."""
+    if created:
+        apply_shopping_list_delta(1, [instance.recipe_id], instance.user_id)
+
+
+@receiver(pre_delete, sender=ShoppingList)
+def remove_from_shopping_list_ingredients(sender, instance, **kwargs):
+    """Вычитает ингредиенты рецепта из суммарного списка покупок."""
+    apply_shopping_list_delta(-1, [instance.recipe_id], instance.user_id)
+
+
+@receiver(post_save, sender=Recipe)
+def schedule_image_derivatives(sender, instance, update_fields, **kwargs):
+    """
+    Ставит изображение рецепта в очередь обработки после сохранения.
+
+    Обработка запускается после фиксации транзакции и только если
+    изображение рецепта изменилось. До ее окончания рецепт имеет статус
+    pending.
+    """
+    if update_fields is not None and "image" not in update_fields:
+        return
+    if not instance.image or derivatives_exist(instance):
+        return
+
+    if instance.image_status != ImageStatus.PENDING:
+        instance.image_status = ImageStatus.PENDING
+        Recipe.objects.filter(pk=instance.pk).update(
+            image_status=ImageStatus.PENDING
+        )
+    transaction.on_commit(lambda: schedule_image_processing(instance.pk))
+
+
+def get_image_name(recipe):
+    """Возвращает имя изображения рецепта, не загружая отложенное поле."""
+    value = recipe.__dict__.get("image")
+    return getattr(value, "name", value)
+
+
+@receiver(post_init, sender=Recipe)
+def remember_image_name(sender, instance, **kwargs):
+    """Запоминает имя изображения, с которым рецепт загружен из базы."""
+    instance._saved_image_name = get_image_name(instance)
+
+
+@receiver(post_save, sender=Recipe)
+def delete_replaced_image_derivatives(sender, instance, created, **kwargs):
+    """Удаляет производные изображения замененного оригинала."""
+    old_name = instance._saved_image_name
+    instance._saved_image_name = get_image_name(instance)
+    if created or not old_name or old_name == instance._saved_image_name:
+        return
+    transaction.on_commit(lambda: schedule_derivatives_deletion(old_name))
+
+
+@receiver(post_delete, sender=Recipe)
+def delete_recipe_image_derivatives(sender, instance, **kwargs):
+    """Удаляет производные изображения удаленного рецепта."""
+    name = get_image_name(instance)
+    if name:
+        transaction.on_commit(lambda: schedule_derivatives_deletion(name))
@@ -0,0 +1,72 @@
+from django.test import SimpleTestCase
+
+from .units import normalize_shopping_list
+
+
+def row(name, measurement_unit, total_amount):
+    """Возвращает строку списка покупок в формате выборки из базы."""
+    return {
+        "ingredient__name": name,
+        "ingredient__measurement_unit": measurement_unit,
+        "total_amount": total_amount,
+    }
+
+
+class NormalizeShoppingListTest(SimpleTestCase):
+    """Объединение строк списка покупок с совместимыми единицами."""
+
+    def normalize(self, *rows):
+        """Возвращает нормализованный список покупок."""
+        return list(normalize_shopping_list(rows))
+
+    def test_grams_and_kilograms_are_merged(self):
+        """Граммы и килограммы одного ингредиента суммируются."""
+        self.assertEqual(
+            self.normalize(row("мука", "г", 500), row("мука", "кг", 1)),
+            [row("мука", "кг", 1.5)],
+        )
+
+    def test_whole_amount_is_integer(self):
+        """Целое количество в крупной единице выводится целым числом."""
+        result = self.normalize(row("мука", "г", 500), row("мука", "г", 500))
+        self.assertEqual(result, [row("мука", "кг", 1)])
+        self.assertIsInstance(result[0]["total_amount"], int)
+
+    def test_fractional_amount(self):
+        """Дробное количество в крупной единице выводится дробью."""
+        self.assertEqual(
+            self.normalize(row("молоко", "мл", 250), row("молоко", "л", 1)),
+            [row("молоко", "л", 1.25)],
+        )
+
+    def test_small_amount_keeps_base_unit(self):
+        """Количество меньше крупной единицы остается в базовой."""
+        self.assertEqual(
+            self.normalize(row("соль", "гр.", 5), row("соль", "г", 10)),
+            [row("соль", "г", 15)],
+        )
+
+    def test_non_convertible_units_are_kept_apart(self):
+        """Несовместимые единицы одного ингредиента не смешиваются."""
+        self.assertEqual(
+            self.normalize(
+                row("яйца", "г", 100),
+                row("яйца", "шт", 2),
+                row("яйца", "штука", 1),
+            ),
+            [row("яйца", "г", 100), row("яйца", "шт.", 3)],
+        )
+
+    def test_unknown_unit_is_passed_through(self):
+        """Неизвестная единица выводится как есть."""
+        self.assertEqual(
+            self.normalize(row("перец", "по вкусу", 1)),
+            [row("перец", "по вкусу", 1)],
+        )
+
+    def test_different_ingredients_are_not_merged(self):
+        """Разные ингредиенты остаются отдельными строками по порядку."""
+        self.assertEqual(
+            self.normalize(row("мука", "г", 200), row("сахар", "кг", 2)),
+            [row("мука", "г", 200), row("сахар", "кг", 2)],
+        )
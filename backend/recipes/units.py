@@ -0,0 +1,96 @@
+from decimal import Decimal
+from itertools import groupby
+from operator import itemgetter
+
+# Варианты написания единиц измерения и их каноническая форма.
+UNIT_ALIASES = {
+    "гр": "г",
+    "гр.": "г",
+    "г.": "г",
+    "грамм": "г",
+    "кг.": "кг",
+    "килограмм": "кг",
+    "мл.": "мл",
+    "миллилитр": "мл",
+    "л.": "л",
+    "литр": "л",
+    "шт": "шт.",
+    "штука": "шт.",
+    "ст.л.": "ст. л.",
+    "ст. л": "ст. л.",
+    "ч.л.": "ч. л.",
+    "ч. л": "ч. л.",
+}
+
+# Единица измерения: (базовая единица, множитель к базовой единице).
+UNIT_SCALES = {
+    "г": ("г", 1),
+    "кг": ("г", 1000),
+    "мл": ("мл", 1),
+    "л": ("мл", 1000),
+}
+
+# Единицы для вывода количества в базовой единице, от большей к меньшей.
+DISPLAY_UNITS = {
+    "г": (("кг", 1000), ("г", 1)),
+    "мл": (("л", 1000), ("мл", 1)),
+}
+
+
+def normalize_unit(measurement_unit):
+    """Приводит единицу измерения к канонической форме."""
+    measurement_unit = " ".join(measurement_unit.lower().split())
+    return UNIT_ALIASES.get(measurement_unit, measurement_unit)
+
+
+def to_base_unit(measurement_unit, amount):
+    """
+    Переводит количество в базовую единицу измерения.
+
+    Возвращает пару (базовая единица, количество). Единицы, для которых
+    нет пересчета, остаются как есть.
+    """
+    measurement_unit = normalize_unit(measurement_unit)
+    base_unit, factor = UNIT_SCALES.get(
+        measurement_unit, (measurement_unit, 1)
+    )
+    return base_unit, amount * factor
+
+
+def to_display_unit(base_unit, amount):
+    """Переводит количество из базовой единицы в наиболее крупную."""
+    for measurement_unit, factor in DISPLAY_UNITS.get(base_unit, ()):
+        if amount >= factor:
+            value = Decimal(amount) / factor
+            if value == value.to_integral_value():
+                return measurement_unit, int(value)
+            return measurement_unit, float(value)
+    return base_unit, amount
+
+
+def normalize_shopping_list(recipes_in_shopping_list):
+    """
+    Объединяет строки списка покупок с совместимыми единицами измерения.
+
+    Строки должны быть упорядочены по названию ингредиента: они
+    обрабатываются группами по названию, поэтому список не загружается в
+    память целиком. Количества внутри группы переводятся в базовые
+    единицы, суммируются и выводятся в наиболее крупной единице.
+    """
+    for name, rows in groupby(
+        recipes_in_shopping_list, key=itemgetter("ingredient__name")
+    ):
+        totals = {}
+        for row in rows:
+            base_unit, amount = to_base_unit(
+                row["ingredient__measurement_unit"], row["total_amount"]
+            )
+            totals[base_unit] = totals.get(base_unit, 0) + amount
+
+        for base_unit, amount in totals.items():
+            measurement_unit, amount = to_display_unit(base_unit, amount)
+            yield {
+                "ingredient__name": name,
+                "ingredient__measurement_unit": measurement_unit,
+                "total_amount": amount,
+            }
@@ -9,7 +9,14 @@ admin.site.empty_value_display = "Не задано"
 class MyUserAdmin(admin.ModelAdmin):
     """Административная панель для управления пользователями."""
 
-    list_display = ("username", "first_name", "last_name", "email")
+    list_display = (
+        "username",
+        "first_name",
+        "last_name",
+        "email",
+        "recipes_count",
+        "followers_count",
+    )
     list_filter = ("username", "email")
     search_fields = ("username",)
 
@@ -21,6 +21,12 @@ class User(AbstractUser):
     )
     first_name = models.CharField("Имя", max_length=MAX_USERNAME_LENGTH)
     last_name = models.CharField("Фамилия", max_length=MAX_USERNAME_LENGTH)
+    recipes_count = models.PositiveIntegerField(
+        "Число рецептов", default=0, editable=False
+    )
+    followers_count = models.PositiveIntegerField(
+        "Число подписчиков", default=0, editable=False
+    )
 
     USERNAME_FIELD = "email"
     REQUIRED_FIELDS = ["username", "first_name", "last_name"]